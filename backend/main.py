@@ -1,6 +1,22 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from typing import Optional
 import snowflake.connector
+import io
+import re
+import json
+import datetime
+import decimal
+import time
+import hashlib
+import queue
+import asyncio
+import threading
+from functools import partial
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from dotenv import load_dotenv
 import os
@@ -37,34 +53,740 @@ API_SNOWFLAKE_CONFIG = {
     "role": os.getenv('SNOWFLAKE_ROLE')
 }
 
+# Connection pool settings: connections opened at startup, the hard cap, how long a
+# request waits for a free connection, and how long an idle connection is trusted
+# before it is pinged again
+API_POOL_MIN_SIZE = int(os.getenv('API_POOL_MIN_SIZE', '2'))
+API_POOL_MAX_SIZE = int(os.getenv('API_POOL_MAX_SIZE', '8'))
+API_POOL_TIMEOUT = float(os.getenv('API_POOL_TIMEOUT', '30'))
+API_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('API_POOL_HEALTH_CHECK_INTERVAL', '60'))
+API_POOL_DRAIN_TIMEOUT = float(os.getenv('API_POOL_DRAIN_TIMEOUT', '30'))
+
+# Session context a request may change with USE; restored in this order on release,
+# since USE DATABASE also resets the schema
+SESSION_CONTEXT = ('role', 'warehouse', 'database', 'schema')
+# Statements that change session state the pool cannot restore; a connection that ran
+# one is closed instead of being reused
+SESSION_ALTERING_STATEMENT = re.compile(r'^\s*(ALTER\s+SESSION|USE\s+SECONDARY\s+ROLES)\b', re.IGNORECASE)
+
+class SnowflakeConnectionPool:
+    """Bounded pool of authenticated Snowflake sessions shared by all requests.
+
+    Connections are opened with client_session_keep_alive so idle sessions do not
+    expire, pinged before reuse when they have been idle for a while, and put back
+    with their transaction rolled back and their role, warehouse, database and schema
+    reset. Connections whose session was altered otherwise are closed.
+    """
+
+    def __init__(self, config, min_size=API_POOL_MIN_SIZE, max_size=API_POOL_MAX_SIZE):
+        self.config = dict(config, client_session_keep_alive=True)
+        self.min_size = min_size
+        self.max_size = max_size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._closed = False
+
+    def _open(self):
+        conn = snowflake.connector.connect(**self.config)
+        # The session's initial context, restored whenever the connection is returned.
+        # Read from the server; the connector only tracks it once a query has run.
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT {', '.join(f'CURRENT_{attr.upper()}()' for attr in SESSION_CONTEXT)}")
+            conn.home_context = dict(zip(SESSION_CONTEXT, cur.fetchone()))
+        conn.session_altered = False
+        conn.last_used = time.monotonic()
+        return conn
+
+    def _healthy(self, conn):
+        if conn.is_closed():
+            return False
+        if time.monotonic() - conn.last_used < API_POOL_HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except Exception as e:
+            logger.warning(f"Discarding unhealthy Snowflake connection: {str(e)}")
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def warm_up(self):
+        """Open min_size connections ahead of the first request"""
+        opened = []
+        for _ in range(self.min_size):
+            try:
+                opened.append(self._open())
+            except Exception as e:
+                logger.error(f"Could not pre-warm Snowflake connection: {str(e)}")
+                break
+        for conn in opened:
+            self._idle.put(conn)
+        logger.info(f"Snowflake pool warmed with {len(opened)} connections")
+
+    def acquire(self, timeout=API_POOL_TIMEOUT):
+        if self._closed:
+            raise RuntimeError("Snowflake connection pool is closed")
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No Snowflake connection available within {timeout}s")
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    conn = self._open()
+                    break
+                if self._healthy(conn):
+                    break
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+        return conn
+
+    def release(self, conn):
+        try:
+            if self._closed or conn.is_closed():
+                self._discard(conn)
+                return
+            if conn.session_altered:
+                logger.info("Closing Snowflake connection whose session settings were altered")
+                self._discard(conn)
+                return
+            try:
+                # Never hand out a connection with an open transaction or another request's context
+                conn.rollback()
+                self._restore_context(conn)
+            except Exception as e:
+                logger.warning(f"Could not reset Snowflake connection, closing it: {str(e)}")
+                self._discard(conn)
+                return
+            conn.last_used = time.monotonic()
+            self._idle.put(conn)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def _restore_context(self, conn):
+        for attr in SESSION_CONTEXT:
+            home, current = conn.home_context[attr], getattr(conn, attr)
+            if (current or '').upper() == (home or '').upper():
+                continue
+            if not home:
+                raise RuntimeError(f"Session {attr} changed to {current} and has no initial value to restore")
+            with conn.cursor() as cur:
+                cur.execute(f"USE {attr.upper()} {home}")
+
+    def use_schema(self, conn, schema):
+        """Switch the session schema, skipping the round trip when it is already set"""
+        if (conn.schema or '').upper() != schema.upper():
+            with conn.cursor() as cur:
+                cur.execute(f"USE SCHEMA {schema}")
+            logger.info(f"Schema set to: {schema}")
+
+    def drain(self, timeout=API_POOL_DRAIN_TIMEOUT):
+        """Stop handing out connections, wait for in-flight requests and close everything"""
+        self._closed = True
+        deadline = time.monotonic() + timeout
+        while self._in_use and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if self._in_use:
+            logger.warning(f"Closing Snowflake pool with {self._in_use} connections still in use")
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        logger.info("Snowflake pool drained")
+
+snowflake_pool = SnowflakeConnectionPool(API_SNOWFLAKE_CONFIG)
+
+# Blocking connector calls run on this executor, never on the event loop. One thread
+# per pooled connection; query_slots admits at most that many requests, so a request
+# holding a session never waits for a thread behind requests waiting for a session.
+query_executor = ThreadPoolExecutor(max_workers=API_POOL_MAX_SIZE, thread_name_prefix='snowflake')
+query_slots = None
+
+# Statements that may run long are submitted with execute_async and polled
+API_SMALL_RESULT_LIMIT = int(os.getenv('API_SMALL_RESULT_LIMIT', '1000'))
+API_ASYNC_POLL_MIN = 0.05
+API_ASYNC_POLL_MAX = 1.0
+API_QUERY_TIMEOUT = float(os.getenv('API_QUERY_TIMEOUT', '600'))
+
+QUICK_STATEMENT = re.compile(r'^\s*(SHOW|DESCRIBE|DESC|USE)\b', re.IGNORECASE)
+LIMIT_CLAUSE = re.compile(r'\bLIMIT\s+(\d+)\s*;?\s*$', re.IGNORECASE)
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the query executor and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(query_executor, partial(func, *args, **kwargs))
+
+def is_long_statement(sql):
+    """Heuristic: only metadata commands and small LIMIT queries are run synchronously"""
+    if QUICK_STATEMENT.match(sql):
+        return False
+    limit = LIMIT_CLAUSE.search(sql)
+    return not (limit and int(limit.group(1)) <= API_SMALL_RESULT_LIMIT)
+
+def open_cursor(conn, sql):
+    """Execute a statement synchronously and return the cursor holding its results"""
+    cur = conn.cursor()
+    try:
+        cur.execute(sql)
+    except Exception:
+        cur.close()
+        raise
+    return cur
+
+def open_result_cursor(conn, query_id):
+    """Cursor over the results of a finished query, with its metadata and result batches loaded.
+
+    query_result fetches them right away; get_results_from_sfqid would only load them
+    on the first fetch, leaving description and get_result_batches() as None until then.
+    """
+    cur = conn.cursor()
+    try:
+        cur.query_result(query_id)
+    except Exception:
+        cur.close()
+        raise
+    return cur
+
+def fetch_all(cur):
+    """Read every row of a result cursor and close it; returns (columns, rows)"""
+    try:
+        return [desc[0] for desc in cur.description], cur.fetchall()
+    finally:
+        cur.close()
+
+def cancel_query(conn, query_id):
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT SYSTEM$CANCEL_QUERY('{query_id}')")
+
+async def wait_for_query(conn, query_id, timeout=API_QUERY_TIMEOUT):
+    """Poll an asynchronous query's status without blocking the loop"""
+    deadline = time.monotonic() + timeout
+    delay = API_ASYNC_POLL_MIN
+    try:
+        while True:
+            status = await run_blocking(conn.get_query_status_throw_if_error, query_id)
+            if not conn.is_still_running(status):
+                return
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Query {query_id} did not finish within {timeout}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, API_ASYNC_POLL_MAX)
+    except (asyncio.CancelledError, TimeoutError):
+        # Client went away or the query ran too long: stop paying for it
+        await asyncio.shield(run_blocking(cancel_query, conn, query_id))
+        raise
+
+async def execute_statement(conn, sql):
+    """Run a statement and return a cursor positioned on its results.
+
+    Long statements are submitted with execute_async and polled; the session is held
+    but no thread is blocked while the warehouse works.
+    """
+    if SESSION_ALTERING_STATEMENT.match(sql):
+        # Marked before running, so a failed statement cannot leave the session half-changed
+        conn.session_altered = True
+    if not is_long_statement(sql):
+        return await run_blocking(open_cursor, conn, sql)
+    with conn.cursor() as cur:
+        await run_blocking(cur.execute_async, sql)
+        query_id = cur.sfqid
+    logger.info(f"Submitted query {query_id}")
+    await wait_for_query(conn, query_id)
+    return await run_blocking(open_result_cursor, conn, query_id)
+
+@app.on_event("startup")
+async def open_snowflake_pool():
+    global query_slots, data_version_lock
+    # Created here so they belong to the server's event loop
+    query_slots = asyncio.Semaphore(API_POOL_MAX_SIZE)
+    data_version_lock = asyncio.Lock()
+    await run_blocking(snowflake_pool.warm_up)
+
+@app.on_event("shutdown")
+async def close_snowflake_pool():
+    await run_blocking(snowflake_pool.drain)
+    query_executor.shutdown(wait=False)
+
+@asynccontextmanager
+async def pooled_session(schema=None):
+    """Admit the request, borrow a pooled connection and give both back afterwards"""
+    await asyncio.wait_for(query_slots.acquire(), API_POOL_TIMEOUT)
+    conn = None
+    try:
+        # Pooled session from the API config (without schema)
+        conn = await run_blocking(snowflake_pool.acquire)
+        if schema:
+            await run_blocking(snowflake_pool.use_schema, conn, schema)
+        yield conn
+    finally:
+        if conn:
+            await asyncio.shield(run_blocking(snowflake_pool.release, conn))
+        query_slots.release()
+
+# Result cache: serialized responses keyed by normalized SQL, schema and data version,
+# evicted LRU once API_CACHE_MAX_BYTES is exceeded and expired after API_CACHE_TTL.
+# With API_CACHE_DIR set, entries are also shared with other workers through files.
+API_CACHE_MAX_BYTES = int(os.getenv('API_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+API_CACHE_TTL = float(os.getenv('API_CACHE_TTL', '900'))
+API_CACHE_DIR = os.getenv('API_CACHE_DIR')
+# The pipelines append to this table on every publish; its last commit time is the
+# data version. Reading it is a metadata call and does not resume the warehouse.
+API_DATA_VERSION_TABLE = os.getenv(
+    'API_DATA_VERSION_TABLE', f"{os.getenv('SNOWFLAKE_DATABASE')}.RAW_STAGING.DATA_VERSION"
+)
+API_DATA_VERSION_CHECK_INTERVAL = float(os.getenv('API_DATA_VERSION_CHECK_INTERVAL', '30'))
+
+CACHEABLE_STATEMENT = re.compile(r'^\s*(SELECT|WITH|SHOW|DESCRIBE|DESC)\b', re.IGNORECASE)
+SQL_TOKEN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\s+|[^'\"\s]+")
+
+def normalize_sql(sql):
+    """Collapse whitespace outside quoted literals and drop trailing semicolons"""
+    parts = []
+    for token in SQL_TOKEN.findall(sql.strip().rstrip(';').strip()):
+        parts.append(' ' if token.isspace() else token)
+    return ''.join(parts)
+
+class ResultCache:
+    """In-process LRU of serialized results under a byte budget, with an optional disk tier"""
+
+    def __init__(self, max_bytes=API_CACHE_MAX_BYTES, ttl=API_CACHE_TTL, directory=API_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = directory
+        self.version = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, sql, schema):
+        text = f"{self.version}\n{schema.upper()}\n{normalize_sql(sql)}"
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                expires_at, payload = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    return payload
+                self._remove(key)
+        if self.directory:
+            return self._get_file(key)
+        return None
+
+    def _get_file(self, key):
+        path = self._path(key)
+        try:
+            age = time.time() - os.path.getmtime(path)
+            if age >= self.ttl:
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                payload = f.read()
+        except OSError:
+            return None
+        self._put_memory(key, payload, self.ttl - age)
+        return payload
+
+    def put(self, key, payload):
+        if len(payload) > self.max_bytes // 4:
+            # One huge result would flush everything else
+            return
+        self._put_memory(key, payload, self.ttl)
+        if self.directory:
+            path = self._path(key)
+            try:
+                with open(f"{path}.{os.getpid()}.tmp", 'wb') as f:
+                    f.write(payload)
+                os.replace(f"{path}.{os.getpid()}.tmp", path)
+            except OSError as e:
+                logger.warning(f"Could not write cache file {path}: {str(e)}")
+
+    def _put_memory(self, key, payload, ttl):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, payload)
+            self._bytes += len(payload)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, payload = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def set_version(self, version):
+        """Switch to a new data version; entries of older versions become unreachable"""
+        if version == self.version:
+            return
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            logger.info(f"Data version changed from {self.version} to {version}, result cache cleared")
+            self.version = version
+        if self.directory:
+            self._sweep_files()
+
+    def clear(self):
+        """Drop every entry, including the shared files"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.directory:
+            self._sweep_files(max_age=0)
+
+    def _sweep_files(self, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if time.time() - os.path.getmtime(path) >= max_age:
+                    os.remove(path)
+            except OSError:
+                pass
+
+result_cache = ResultCache()
+data_version_checked_at = 0.0
+data_version_lock = None
+
+def read_data_version(conn):
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT SYSTEM$LAST_CHANGE_COMMIT_TIME('{API_DATA_VERSION_TABLE}')")
+        return str(cur.fetchone()[0])
+
+async def refresh_data_version():
+    """Re-read the data version at most every API_DATA_VERSION_CHECK_INTERVAL seconds"""
+    global data_version_checked_at
+    if time.monotonic() - data_version_checked_at < API_DATA_VERSION_CHECK_INTERVAL:
+        return
+    async with data_version_lock:
+        if time.monotonic() - data_version_checked_at < API_DATA_VERSION_CHECK_INTERVAL:
+            return
+        try:
+            async with pooled_session() as conn:
+                result_cache.set_version(await run_blocking(read_data_version, conn))
+        except Exception as e:
+            # Serve without the cache rather than risk stale results
+            logger.warning(f"Could not read data version: {str(e)}")
+            result_cache.set_version(None)
+        data_version_checked_at = time.monotonic()
+
+def serialize_rows(columns, rows):
+    return json.dumps(jsonable_encoder({"data": [dict(zip(columns, row)) for row in rows]})).encode('utf-8')
+
+# Streaming responses: results are pulled from the connector in Arrow batches and
+# written out as they arrive, so memory stays flat whatever the result size
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+STREAM_FALLBACK_BATCH_ROWS = 10000
+
+def json_default(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+def result_batches(cur):
+    """Iterate over a result cursor as pyarrow Tables.
+
+    Results that are not delivered in Arrow format (SHOW, DESCRIBE, ...) are read
+    with fetchmany and converted.
+    """
+    import pyarrow as pa
+    from snowflake.connector.errors import NotSupportedError
+
+    try:
+        for table in cur.fetch_arrow_batches():
+            yield table
+        return
+    except NotSupportedError:
+        pass
+    columns = [desc[0] for desc in cur.description]
+    while True:
+        rows = cur.fetchmany(STREAM_FALLBACK_BATCH_ROWS)
+        if not rows:
+            return
+        yield pa.table({column: [str(row[i]) if row[i] is not None else None for row in rows]
+                        for i, column in enumerate(columns)})
+
+def encode_ndjson(table):
+    return ''.join(json.dumps(row, default=json_default) + '\n' for row in table.to_pylist()).encode('utf-8')
+
+class ArrowStreamEncoder:
+    """Write Tables as one Arrow IPC stream, returning the bytes produced by each write"""
+
+    def __init__(self):
+        self.sink = io.BytesIO()
+        self.writer = None
+        self.schema = None
+
+    def _drain(self):
+        data = self.sink.getvalue()
+        self.sink.seek(0)
+        self.sink.truncate()
+        return data
+
+    def write(self, table):
+        import pyarrow as pa
+
+        # Snowflake picks the narrowest integer type per batch; widen so every batch
+        # fits the schema of the first
+        table = table.cast(pa.schema([
+            field.with_type(pa.int64()) if pa.types.is_integer(field.type) else field
+            for field in table.schema
+        ]))
+        if self.writer is None:
+            self.schema = table.schema
+            self.writer = pa.ipc.new_stream(self.sink, self.schema)
+        elif table.schema != self.schema:
+            table = table.cast(self.schema)
+        self.writer.write_table(table)
+        return self._drain()
+
+    def close(self, columns):
+        import pyarrow as pa
+
+        if self.writer is None:
+            # Empty result: still send a valid stream with the column names
+            self.writer = pa.ipc.new_stream(self.sink, pa.schema([(column, pa.string()) for column in columns]))
+        self.writer.close()
+        return self._drain()
+
+async def stream_results(request):
+    """Execute the query, then yield its result batches as NDJSON or Arrow IPC.
+
+    The first item is an empty chunk, yielded once the query has finished.
+    """
+    # The session stays checked out until the last batch has been sent
+    async with pooled_session(request.schema) as conn:
+        cur = await execute_statement(conn, request.query)
+        try:
+            yield b''
+            batches = result_batches(cur)
+            arrow = ArrowStreamEncoder() if request.format == 'arrow' else None
+            while True:
+                table = await run_blocking(next, batches, None)
+                if table is None:
+                    break
+                yield arrow.write(table) if arrow else encode_ndjson(table)
+            if arrow:
+                # Read once the results are loaded; description is None before that
+                yield arrow.close([desc[0] for desc in cur.description])
+        except Exception as e:
+            # Headers are already sent; the client sees a truncated stream
+            logger.error(f"Error streaming query results: {str(e)}")
+            raise
+        finally:
+            cur.close()
+
+async def stream_query(request):
+    """Execute the query, then stream its result batches as NDJSON or Arrow IPC"""
+    body = stream_results(request)
+    # Run the query before the headers are sent, so its errors still become a 500.
+    # Once started, the generator returns the session and query slot when it is closed,
+    # even if the response is cancelled before it is iterated.
+    await body.__anext__()
+    return StreamingResponse(body, media_type=STREAM_FORMATS[request.format])
+
 class QueryRequest(BaseModel):
     query: str
     schema: str
+    # json (default, one document), ndjson or arrow (streamed)
+    format: str = "json"
 
 @app.post("/api/execute-query")
 async def execute_query(request: QueryRequest):
-    conn = None
+    if request.format != 'json' and request.format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {request.format}")
     try:
-        # Use API config (without schema) for queries
-        conn = snowflake.connector.connect(**API_SNOWFLAKE_CONFIG)
-        cur = conn.cursor()
+        if request.format in STREAM_FORMATS:
+            return await stream_query(request)
         
-        # Set the schema based on request
-        cur.execute(f"USE SCHEMA {request.schema}")
-        logger.info(f"Schema set to: {request.schema}")
+        cacheable = bool(CACHEABLE_STATEMENT.match(request.query))
+        if cacheable:
+            await refresh_data_version()
+            cacheable = result_cache.version is not None
+        if cacheable:
+            key = result_cache.key(request.query, request.schema)
+            payload = result_cache.get(key)
+            if payload is not None:
+                return Response(content=payload, media_type='application/json', headers={'X-Cache': 'HIT'})
         
-        # Execute the query
-        cur.execute(request.query)
-        results = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
+        async with pooled_session(request.schema) as conn:
+            # Execute the query
+            cur = await execute_statement(conn, request.query)
+            columns, results = await run_blocking(fetch_all, cur)
         
-        data = [dict(zip(columns, row)) for row in results]
-        return {"data": data}
+        payload = serialize_rows(columns, results)
+        if cacheable:
+            result_cache.put(key, payload)
+        return Response(content=payload, media_type='application/json', headers={'X-Cache': 'MISS'})
         
     except Exception as e:
         logger.error(f"Error executing query: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+# Server-side pagination: the query runs once and pages are read from its persisted
+# result (kept by Snowflake for 24 hours). Result batch descriptors are remembered per
+# query ID; a worker that has not seen the query looks them up by ID, which does not
+# run the query again.
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', '1000'))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '10000'))
+API_PAGED_RESULTS_TTL = float(os.getenv('API_PAGED_RESULTS_TTL', '3600'))
+API_PAGED_RESULTS_MAX = 256
+
+QUERY_ID = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+
+class PagedResult:
+    def __init__(self, query_id, columns, batches):
+        self.query_id = query_id
+        self.columns = columns
+        self.batches = batches
+        self.total_rows = sum(batch.rowcount for batch in batches)
+        self.expires_at = time.monotonic() + API_PAGED_RESULTS_TTL
+
+    def page(self, number, page_size):
+        """Rows of one zero-based page; only the result batches it overlaps are downloaded"""
+        first = number * page_size
+        last = first + page_size
+        rows = []
+        start = 0
+        for batch in self.batches:
+            end = start + batch.rowcount
+            if end > first and start < last:
+                for position, row in enumerate(batch, start):
+                    if position >= last:
+                        break
+                    if position >= first:
+                        rows.append(row)
+            start = end
+            if start >= last:
+                break
+        return rows
+
+paged_results = OrderedDict()
+paged_results_lock = threading.Lock()
+
+def remember_paged_result(result):
+    with paged_results_lock:
+        paged_results[result.query_id] = result
+        paged_results.move_to_end(result.query_id)
+        while len(paged_results) > API_PAGED_RESULTS_MAX:
+            paged_results.popitem(last=False)
+
+def cached_paged_result(query_id):
+    with paged_results_lock:
+        result = paged_results.get(query_id)
+        if result and result.expires_at > time.monotonic():
+            paged_results.move_to_end(query_id)
+            return result
+        paged_results.pop(query_id, None)
+        return None
+
+def paged_result_from_cursor(cur):
+    try:
+        return PagedResult(cur.sfqid, [desc[0] for desc in cur.description], cur.get_result_batches())
     finally:
-        if conn:
-            conn.close()
+        cur.close()
+
+def page_response(result, number, page_size, rows):
+    return {
+        "query_id": result.query_id,
+        "total_rows": result.total_rows,
+        "page": number,
+        "page_size": page_size,
+        "pages": -(-result.total_rows // page_size),
+        "data": [dict(zip(result.columns, row)) for row in rows],
+    }
+
+def check_page_size(page_size):
+    if not 1 <= page_size <= API_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"page_size must be between 1 and {API_MAX_PAGE_SIZE}")
+
+class PagedQueryRequest(BaseModel):
+    query: str
+    schema: str
+    page_size: int = API_PAGE_SIZE
+
+@app.post("/api/execute-query/paged")
+async def execute_paged_query(request: PagedQueryRequest):
+    """Run a query once and return its query ID, total row count and first page"""
+    check_page_size(request.page_size)
+    try:
+        async with pooled_session(request.schema) as conn:
+            cur = await execute_statement(conn, request.query)
+            result = await run_blocking(paged_result_from_cursor, cur)
+        # Result batches are downloaded without the session
+        rows = await run_blocking(result.page, 0, request.page_size)
+        remember_paged_result(result)
+        return page_response(result, 0, request.page_size, rows)
+    
+    except Exception as e:
+        logger.error(f"Error executing paged query: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/query-results/{query_id}")
+async def get_query_page(query_id: str, page: int = 0, page_size: int = API_PAGE_SIZE):
+    """Serve one page of an earlier query from its persisted result"""
+    if not QUERY_ID.match(query_id):
+        raise HTTPException(status_code=400, detail="Invalid query id")
+    check_page_size(page_size)
+    if page < 0:
+        raise HTTPException(status_code=400, detail="page must not be negative")
+    try:
+        result = cached_paged_result(query_id)
+        if result is not None:
+            try:
+                rows = await run_blocking(result.page, page, page_size)
+            except Exception as e:
+                # Batch download URLs expire; look the result up again by ID
+                logger.warning(f"Refreshing result batches of {query_id}: {str(e)}")
+                result = None
+        if result is None:
+            # Only the lookup by ID needs a session
+            async with pooled_session() as conn:
+                cur = await run_blocking(open_result_cursor, conn, query_id)
+                result = await run_blocking(paged_result_from_cursor, cur)
+            remember_paged_result(result)
+            rows = await run_blocking(result.page, page, page_size)
+        return page_response(result, page, page_size, rows)
+    
+    except Exception as e:
+        logger.error(f"Error reading page {page} of query {query_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/cache/invalidate")
+async def invalidate_cache():
+    """Drop cached results and re-read the data version on the next request"""
+    global data_version_checked_at
+    result_cache.clear()
+    data_version_checked_at = 0.0
+    return {"invalidated": True}
 
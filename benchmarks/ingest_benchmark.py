@@ -0,0 +1,304 @@
+"""Local throughput benchmark for the SEC ingest pipeline.
+
+Generates a synthetic quarterly ZIP, serves it from a local HTTP server and runs the
+pipeline stages against stand-ins: moto for S3 and DuckDB in place of Snowflake.
+Reports wall time, MB/s, rows/s and peak RSS per stage.
+
+    python benchmarks/ingest_benchmark.py --size-mb 200
+    python benchmarks/ingest_benchmark.py --size-mb 200 --output results.json
+    python benchmarks/ingest_benchmark.py --baseline results.json --max-regression 0.2
+"""
+import os
+import re
+import sys
+import glob
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from zipfile import ZipFile, ZIP_DEFLATED
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dags'))
+
+from pipeline_metrics import RSSSampler
+
+YEAR, QUARTER = '2099', '1'
+
+def measure(results, stage, func, nbytes=0, rows=0):
+    """Run one stage and record its metrics; func may return (nbytes, rows) to override"""
+    with RSSSampler() as sampler:
+        start = time.perf_counter()
+        outcome = func()
+        elapsed = time.perf_counter() - start
+    if isinstance(outcome, tuple) and len(outcome) == 2:
+        nbytes, rows = outcome
+    results[stage] = {
+        'seconds': round(elapsed, 3),
+        'mb_per_s': round(nbytes / 1e6 / elapsed, 2) if elapsed else None,
+        'rows_per_s': round(rows / elapsed) if elapsed and rows else None,
+        'peak_rss_mb': round(sampler.peak / 1e6, 1),
+    }
+    print(f"{stage:<12} {elapsed:8.2f}s  {results[stage]['mb_per_s'] or 0:9.1f} MB/s  "
+          f"{results[stage]['rows_per_s'] or 0:11,} rows/s  {results[stage]['peak_rss_mb']:8.1f} MB RSS")
+    return outcome
+
+def generate_quarter_zip(path, size_mb, seed=42):
+    """Write a synthetic SEC quarterly archive; num.txt makes up most of size_mb.
+
+    Returns {member: rows}.
+    """
+    rng = random.Random(seed)
+    filings = [f"{rng.randint(1000000, 9999999):010d}-99-{i:06d}" for i in range(max(100, size_mb * 20))]
+    tags = [f"Tag{i}" for i in range(5000)]
+    rows = {}
+    work_dir = tempfile.mkdtemp(prefix='sec_bench_gen_')
+    try:
+        members = {
+            'sub.txt': ('adsh\tcik\tname\tsic\tcountryba\tform\tperiod\tfy\tfp\tfiled\tprevrpt\tdetail\tnciks\n',
+                        lambda i: f"{filings[i]}\t{rng.randint(1, 2000000)}\tCompany {i}\t{rng.randint(100, 9999)}\tUS\t10-Q\t20990331\t2099\tQ1\t20990415\t0\t0\t1\n",
+                        len(filings)),
+            'tag.txt': ('tag\tversion\tcustom\tabstract\tdatatype\tiord\tcrdr\ttlabel\tdoc\n',
+                        lambda i: f"{tags[i % len(tags)]}\t{'us-gaap/2099' if i < len(tags) else filings[i % len(filings)]}\t{int(i >= len(tags))}\t0\tmonetary\tI\tD\tLabel {i}\tDocumentation {i}\n",
+                        len(tags) * 2),
+            'pre.txt': ('adsh\treport\tline\tstmt\tinpth\trfile\ttag\tversion\tplabel\tnegating\n',
+                        lambda i: f"{filings[i % len(filings)]}\t{rng.randint(1, 9)}\t{i % 60}\tBS\t0\tH\t{rng.choice(tags)}\tus-gaap/2099\tLabel {i}\t0\n",
+                        None),
+            'num.txt': ('adsh\ttag\tversion\tddate\tqtrs\tuom\tsegments\tcoreg\tvalue\tfootnote\n',
+                        lambda i: f"{filings[i % len(filings)]}\t{rng.choice(tags)}\tus-gaap/2099\t20990331\t{rng.choice((0, 1, 4))}\tUSD\t\t\t{rng.uniform(-1e9, 1e9):.2f}\t\n",
+                        None),
+        }
+        budgets = {'pre.txt': size_mb * 0.2e6, 'num.txt': size_mb * 0.8e6}
+        with ZipFile(path, 'w', compression=ZIP_DEFLATED) as zip_file:
+            for member, (header, row, count) in members.items():
+                member_path = os.path.join(work_dir, member)
+                with open(member_path, 'w') as f:
+                    f.write(header)
+                    written = i = 0
+                    while (count is not None and i < count) or (count is None and written < budgets[member]):
+                        line = row(i)
+                        f.write(line)
+                        written += len(line)
+                        i += 1
+                rows[member] = i
+                zip_file.write(member_path, member)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return rows
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+def serve_directory(directory):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class DuckDBCursor:
+    """Snowflake cursor stand-in for load_raw_file.
+
+    PUT copies files into a local stage directory and COPY INTO reads the staged gzip
+    chunks into DuckDB, returning per-file rows_parsed/rows_loaded like Snowflake does.
+    Other statements are passed through to DuckDB.
+    """
+
+    PUT = re.compile(r"^\s*PUT\s+file://(\S+)\s+@(\S+)", re.IGNORECASE)
+    COPY = re.compile(r"^\s*COPY\s+INTO\s+(\w+)\s+FROM\s+@(\S+)", re.IGNORECASE)
+    REMOVE = re.compile(r"^\s*REMOVE\s+@(\S+)", re.IGNORECASE)
+    TRUNCATE = re.compile(r"^\s*TRUNCATE\s+TABLE\s+(\w+)", re.IGNORECASE)
+
+    def __init__(self, db, stage_dir):
+        self.db = db.cursor()
+        self.stage_dir = stage_dir
+        self.description = None
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def _stage_path(self, location):
+        return os.path.join(self.stage_dir, location.strip('/'))
+
+    def _table_exists(self, table_name):
+        return self.db.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [table_name]
+        ).fetchone()[0] > 0
+
+    def _result(self, columns, rows):
+        self.description = [(column,) for column in columns]
+        self._rows = rows
+
+    def execute(self, sql, params=None):
+        self._result([], [])
+        match = self.PUT.match(sql)
+        if match:
+            target = self._stage_path(match.group(2))
+            os.makedirs(target, exist_ok=True)
+            for path in glob.glob(match.group(1)):
+                shutil.copy(path, target)
+            return self
+        match = self.COPY.match(sql)
+        if match:
+            table_name, staged = match.group(1), sorted(glob.glob(os.path.join(self._stage_path(match.group(2)), '*')))
+            rows = []
+            for path in staged:
+                source = f"read_csv('{path}', delim='\t', header=true, all_varchar=true, quote='', null_padding=true)"
+                if self._table_exists(table_name):
+                    loaded = self.db.execute(f"INSERT INTO {table_name} SELECT * FROM {source}").fetchone()[0]
+                else:
+                    self.db.execute(f"CREATE TABLE {table_name} AS SELECT * FROM {source}")
+                    loaded = self.db.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+                rows.append((os.path.basename(path), 'LOADED', loaded, loaded))
+            self._result(['file', 'status', 'rows_parsed', 'rows_loaded'], rows)
+            return self
+        match = self.REMOVE.match(sql)
+        if match:
+            shutil.rmtree(self._stage_path(match.group(1)), ignore_errors=True)
+            return self
+        match = self.TRUNCATE.match(sql)
+        if match:
+            if self._table_exists(match.group(1)):
+                self.db.execute(f"DELETE FROM {match.group(1)}")
+            return self
+        self.db.execute(sql, params)
+        return self
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+class DuckDBConnection:
+    def __init__(self, db, stage_dir):
+        self.db = db
+        self.stage_dir = stage_dir
+
+    def cursor(self):
+        return DuckDBCursor(self.db, self.stage_dir)
+
+def run(size_mb, work_dir):
+    import duckdb
+    from moto import mock_aws
+
+    import connections
+    import raw
+    import tsv_profiler
+    import parquet_convert
+
+    class FakeConnection:
+        login = 'testing'
+        password = 'testing'
+
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    connections.get_aws_connection = lambda conn_id=connections.AWS_CONN_ID: FakeConnection()
+    connections.get_s3_client.cache_clear()
+
+    results = {}
+    serve_dir = os.path.join(work_dir, 'www')
+    os.makedirs(serve_dir, exist_ok=True)
+    zip_name = f"{YEAR}q{QUARTER}.zip"
+    rows = generate_quarter_zip(os.path.join(serve_dir, zip_name), size_mb)
+    total_rows = sum(rows.values())
+    with ZipFile(os.path.join(serve_dir, zip_name)) as zip_file:
+        member_bytes = {info.filename: info.file_size for info in zip_file.infolist()}
+    total_bytes = sum(member_bytes.values())
+    print(f"Generated {zip_name}: {total_bytes / 1e6:.1f} MB uncompressed, {total_rows:,} rows")
+
+    server = serve_directory(serve_dir)
+    url = f"http://127.0.0.1:{server.server_address[1]}/{zip_name}"
+    local_zip = os.path.join(work_dir, zip_name)
+
+    with mock_aws():
+        s3_client = connections.get_s3_client()
+        s3_client.create_bucket(Bucket=raw.RAW_BUCKET)
+
+        def download():
+            archive = raw.stream_download(url, local_zip, {'Accept-Encoding': 'identity'})
+            return archive['size'], 0
+        measure(results, 'download', download)
+
+        # Upload deletes the archive, so keep a copy for the local-only stages
+        kept_zip = os.path.join(work_dir, 'kept.zip')
+        shutil.copyfile(local_zip, kept_zip)
+        measure(results, 'upload', lambda: raw.upload_to_s3([[local_zip, zip_name]], YEAR, QUARTER),
+                nbytes=total_bytes, rows=total_rows)
+
+        measure(results, 'validate', lambda: tsv_profiler.validate_raw_files(YEAR, QUARTER, bucket_name=raw.RAW_BUCKET),
+                nbytes=total_bytes, rows=total_rows)
+
+        # The real per-table loader (stream from S3, split, PUT, COPY) against DuckDB
+        db = duckdb.connect(os.path.join(work_dir, 'bench.duckdb'))
+        conn = DuckDBConnection(db, os.path.join(work_dir, 'stage'))
+        load_dir = os.path.join(work_dir, 'load')
+
+        def load():
+            loaded = 0
+            for table_name, filename in raw.RAW_TABLES.items():
+                loaded += raw.load_raw_file(conn, s3_client, table_name, filename, f"{YEAR}q{QUARTER}",
+                                            load_dir, bucket_name=raw.RAW_BUCKET)[1]
+            shutil.rmtree(load_dir, ignore_errors=True)
+            return total_bytes, loaded
+        measure(results, 'load', load)
+
+    def parquet():
+        import pyarrow as pa
+        converted = 0
+        with ZipFile(kept_zip) as zip_file:
+            for filename in parquet_convert.TSV_SCHEMAS:
+                sink_path = os.path.join(work_dir, filename.replace('.txt', '.parquet'))
+                with zip_file.open(filename) as source, pa.OSFile(sink_path, 'wb') as sink:
+                    converted += parquet_convert.convert_tsv_stream(source, sink, filename)[0]
+        return total_bytes, converted
+    measure(results, 'parquet', parquet)
+
+    server.shutdown()
+    return results
+
+def compare(results, baseline, max_regression):
+    """Stages whose throughput dropped by more than max_regression against a baseline run"""
+    regressions = []
+    for stage, metrics in results.items():
+        before = baseline.get(stage, {}).get('mb_per_s')
+        after = metrics.get('mb_per_s')
+        if before and after is not None and after < before * (1 - max_regression):
+            regressions.append(f"{stage}: {after} MB/s vs baseline {before} MB/s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=50, help='approximate uncompressed size of the synthetic quarter')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='allowed MB/s drop vs baseline (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='sec_bench_')
+    try:
+        results = run(args.size_mb, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print("Performance regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
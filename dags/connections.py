@@ -0,0 +1,112 @@
+import atexit
+import queue
+import logging
+import threading
+from functools import lru_cache
+import boto3
+from botocore.config import Config
+from airflow.hooks.base import BaseHook
+from airflow.providers.snowflake.hooks.snowflake import SnowflakeHook
+
+logger = logging.getLogger(__name__)
+
+# Shared clients and connections for every DAG module. Airflow runs each task instance
+# in its own process, so they are created once per task and reused by all of its
+# threads and calls (e.g. the parallel uploads, the per-table loads and retries).
+AWS_CONN_ID = 'aws_default'
+SNOWFLAKE_CONN_ID = 'snowflake_default'
+AWS_REGION = 'us-east-1'
+
+S3_MAX_POOL_CONNECTIONS = 64
+S3_CLIENT_CONFIG = Config(
+    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+    retries={'max_attempts': 10, 'mode': 'adaptive'},
+    tcp_keepalive=True,
+    connect_timeout=10,
+    read_timeout=60
+)
+
+# Idle Snowflake connections kept for reuse; callers are not limited by it
+SNOWFLAKE_POOL_SIZE = 8
+
+@lru_cache(maxsize=None)
+def get_aws_connection(conn_id=AWS_CONN_ID):
+    return BaseHook.get_connection(conn_id)
+
+@lru_cache(maxsize=None)
+def get_s3_client(conn_id=AWS_CONN_ID):
+    """Process-wide S3 client; boto3 clients are thread-safe"""
+    aws_conn = get_aws_connection(conn_id)
+    return boto3.client(
+        's3',
+        aws_access_key_id=aws_conn.login,
+        aws_secret_access_key=aws_conn.password,
+        region_name=AWS_REGION,
+        config=S3_CLIENT_CONFIG
+    )
+
+class SnowflakeConnectionPool:
+    """Reuses open Snowflake connections for one Airflow connection id.
+
+    acquire() opens a new connection whenever none is idle; release() keeps at most
+    max_size idle connections and closes the rest.
+    """
+
+    def __init__(self, conn_id, max_size=SNOWFLAKE_POOL_SIZE):
+        self.conn_id = conn_id
+        self.max_size = max_size
+        self._idle = queue.LifoQueue()
+
+    def acquire(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                logger.info(f"Opening new Snowflake connection for {self.conn_id}")
+                return SnowflakeHook(snowflake_conn_id=self.conn_id).get_conn()
+            if not conn.is_closed():
+                return conn
+
+    def release(self, conn):
+        if conn is None or conn.is_closed():
+            return
+        try:
+            # Never hand out a connection with an open transaction
+            conn.rollback()
+        except Exception:
+            conn.close()
+            return
+        if self._idle.qsize() < self.max_size:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+            except Exception as e:
+                logger.warning(f"Error closing Snowflake connection: {str(e)}")
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def snowflake_pool(conn_id=SNOWFLAKE_CONN_ID):
+    with _pools_lock:
+        if conn_id not in _pools:
+            _pools[conn_id] = SnowflakeConnectionPool(conn_id)
+        return _pools[conn_id]
+
+def acquire_snowflake_connection(conn_id=SNOWFLAKE_CONN_ID):
+    """Take an open connection from the pool; give it back with release_snowflake_connection"""
+    return snowflake_pool(conn_id).acquire()
+
+def release_snowflake_connection(conn, conn_id=SNOWFLAKE_CONN_ID):
+    snowflake_pool(conn_id).release(conn)
+
+@atexit.register
+def close_snowflake_pools():
+    for pool in list(_pools.values()):
+        pool.close_all()
@@ -1,11 +1,26 @@
 from airflow import DAG
 from airflow.operators.bash import BashOperator
+from airflow.operators.python import PythonOperator
 from datetime import datetime, timedelta
+from sec_datasets import RAW_DATABASE, RAW_SCHEMA, RAW_TABLE_DATASETS
+from connections import acquire_snowflake_connection, release_snowflake_connection
+from load_ledger import ensure_data_version_table, publish_data_version
 
 # Define constants
 DBT_PROJECT_DIR = "/opt/airflow/dags/financial_dbt_project"
 DBT_PROFILES_DIR = "/opt/airflow/dags/financial_dbt_project"
 
+def publish_dbt_data_version(**context):
+    """Tell consumers such as the query API's result cache that the models changed"""
+    conn = acquire_snowflake_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"USE SCHEMA {RAW_DATABASE}.{RAW_SCHEMA}")
+            ensure_data_version_table(cur)
+            publish_data_version(cur, 'dbt_transformation_pipeline', context['run_id'])
+    finally:
+        release_snowflake_connection(conn)
+
 # Define DAG
 default_args = {
     'owner': 'airflow',
@@ -21,7 +36,8 @@ dag = DAG(
     'dbt_transformation_pipeline',
     default_args=default_args,
     description='DBT transformations for SEC financial data',
-    schedule_interval=None,
+    # Runs once the ingest DAG has replaced data in all raw tables, never on no-op ingests
+    schedule=RAW_TABLE_DATASETS,
     catchup=False
 )
 
@@ -56,5 +72,11 @@ dbt_docs = BashOperator(
     dag=dag
 )
 
+publish_version = PythonOperator(
+    task_id='publish_data_version',
+    python_callable=publish_dbt_data_version,
+    dag=dag
+)
+
 # Set task dependencies
-dbt_deps >> dbt_run_staging >> dbt_run_facts >> dbt_test >> dbt_docs
\ No newline at end of file
+dbt_deps >> dbt_run_staging >> dbt_run_facts >> dbt_test >> [dbt_docs, publish_version]
\ No newline at end of file
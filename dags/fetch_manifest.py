@@ -0,0 +1,60 @@
+import os
+import json
+import logging
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+# Manifest of SEC archives already ingested: ETag, Last-Modified, size and sha256.
+# Kept on local disk for fast reruns and mirrored to S3 so every worker sees it.
+LOCAL_MANIFEST_DIR = "./data/manifests"
+MANIFEST_PREFIX = "sec_data/manifest"
+
+def manifest_key(year, quarter):
+    return f"{MANIFEST_PREFIX}/{year}q{quarter}.json"
+
+def load_manifest_entry(s3_client, bucket_name, year, quarter):
+    """Return the stored manifest entry for a quarter, or None if it was never ingested"""
+    local_path = os.path.join(LOCAL_MANIFEST_DIR, f"{year}q{quarter}.json")
+    if os.path.exists(local_path):
+        with open(local_path) as f:
+            return json.load(f)
+
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=manifest_key(year, quarter))
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None
+        raise
+
+    entry = json.loads(response['Body'].read())
+    write_local_entry(local_path, entry)
+    return entry
+
+def save_manifest_entry(s3_client, bucket_name, year, quarter, entry):
+    """Record a successfully ingested archive locally and in S3"""
+    local_path = os.path.join(LOCAL_MANIFEST_DIR, f"{year}q{quarter}.json")
+    write_local_entry(local_path, entry)
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=manifest_key(year, quarter),
+        Body=json.dumps(entry).encode('utf-8'),
+        ContentType='application/json'
+    )
+    logger.info(f"Updated fetch manifest for {year}q{quarter}: {entry}")
+
+def write_local_entry(local_path, entry):
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    tmp_path = f"{local_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, local_path)
+
+def conditional_headers(entry):
+    """Build If-None-Match / If-Modified-Since headers from a manifest entry"""
+    headers = {}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
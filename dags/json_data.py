@@ -1,75 +1,398 @@
+import os
+import re
 import json
-import boto3
-from snowflake.connector import connect
+import gzip
+import zlib
+import heapq
+import shutil
+import hashlib
+import logging
+import multiprocessing
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from airflow.exceptions import AirflowSkipException
+from tsv_profiler import iter_lines, load_profiles, FINGERPRINT_HEX_DIGITS
+from connections import get_s3_client, get_aws_connection, acquire_snowflake_connection, release_snowflake_connection
+from raw import create_external_stage
+from s3_zip import open_raw_member, read_chunks
+from load_ledger import (ensure_ledger_table, quarter_is_current, record_load, copy_result_counts,
+                         ensure_data_version_table, publish_data_version, DATA_VERSION_TABLE)
+from sec_datasets import RAW_SCHEMA
 
-def read_json_from_s3():
-    """Read JSON data from S3"""
+logger = logging.getLogger(__name__)
+
+# Filings are spread over this many NDJSON shards; each shard is built independently
+JSON_SHARD_COUNT = int(os.getenv('SEC_JSON_SHARD_COUNT', '32'))
+JSON_MEMBERS = ['sub.txt', 'num.txt', 'pre.txt', 'tag.txt']
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Custom tags use the filing's accession number as their version
+ADSH_PATTERN = re.compile(r'^\d{10}-\d{2}-\d{6}$')
+
+def read_json_from_s3(bucket_name, file_key):
+    """Stream documents from an NDJSON (optionally gzip) object in S3 one at a time"""
     try:
-        # Initialize S3 client
-        s3_client = boto3.client('s3')
-        
-        # Your S3 bucket and file details
-        bucket_name = 'your-bucket-name'
-        file_key = 'path/to/your/json/file.json'
+        s3_client = get_s3_client()
+        logger.info(f"Reading JSON from S3: {bucket_name}/{file_key}")
         
-        print(f"Reading JSON from S3: {bucket_name}/{file_key}")
-        
-        # Get object from S3
-        response = s3_client.get_object(Bucket=bucket_name, Key=file_key)
-        json_data = json.loads(response['Body'].read().decode('utf-8'))
-        
-        return json_data
+        body = s3_client.get_object(Bucket=bucket_name, Key=file_key)['Body']
+        if file_key.endswith('.gz'):
+            lines = gzip.GzipFile(fileobj=body)
+        else:
+            lines = iter_lines(body.iter_chunks(READ_CHUNK_SIZE))
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
         
     except Exception as e:
-        print(f"Error reading JSON from S3: {str(e)}")
+        logger.error(f"Error reading JSON from S3: {str(e)}")
         raise
 
-def load_json_to_snowflake(json_data):
-    """Load JSON data to Snowflake"""
+def shard_of(adsh, shard_count):
+    return zlib.crc32(adsh) % shard_count
+
+def partition_member(lines, filename, out_dir, shard_count):
+    """Hash-partition one member's rows by adsh into per-shard TSV files (header repeated)"""
+    lines = iter(lines)
+    header = next(lines, b'')
+    columns = header.decode('utf-8').split('\t')
+    # tag.txt has no adsh; custom tags are keyed by the filing in their version column
+    key_index = columns.index('version') if filename == 'tag.txt' else columns.index('adsh')
+
+    outputs = []
     try:
-        # Snowflake connection parameters
-        conn = connect(
-            user='dev_dhrumil_user',
-            password='Dhrumil@123',
-            account='tr28614.us-east4.gcp',
-            warehouse='COMPUTE_WH',
-            database='assignment2_team1',
-            schema='raw_staging'
-        )
-        
-        print("Connected to Snowflake")
+        for shard in range(shard_count):
+            shard_dir = os.path.join(out_dir, f"{shard:04d}")
+            os.makedirs(shard_dir, exist_ok=True)
+            out = open(os.path.join(shard_dir, filename), 'wb')
+            out.write(header + b'\n')
+            outputs.append(out)
+
+        rows = 0
+        for line in lines:
+            if not line:
+                continue
+            fields = line.split(b'\t')
+            if len(fields) <= key_index:
+                continue
+            key = fields[key_index]
+            if filename == 'tag.txt' and not ADSH_PATTERN.match(key.decode('utf-8', 'replace')):
+                # Standard taxonomy tags are not part of any single filing
+                continue
+            outputs[shard_of(key, shard_count)].write(line + b'\n')
+            rows += 1
+        return rows
+    finally:
+        for out in outputs:
+            out.close()
+
+def sorted_member_rows(path, member):
+    """Rows of one shard member as (adsh, member, record) sorted by adsh"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb') as f:
+        columns = f.readline().decode('utf-8').rstrip('\n').split('\t')
+        key = 'version' if member == 'tag' else 'adsh'
+        rows = []
+        for line in f:
+            fields = line.rstrip(b'\n').decode('utf-8', 'replace').split('\t')
+            record = {name: (value if value != '' else None) for name, value in zip(columns, fields)}
+            rows.append((record[key], member, record))
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+def filing_document(adsh, quarter, rows):
+    """Nest all rows of one filing into a single JSON document.
+
+    Values stay as their source text: num.value is DECIMAL(28,4) and would lose digits
+    as a double; cast it with value::NUMBER(28,4) when querying.
+    """
+    document = {'adsh': adsh, 'quarter': quarter, 'sub': None, 'num': [], 'pre': [], 'tag': []}
+    for _, member, record in rows:
+        if member == 'sub':
+            document['sub'] = record
+            continue
+        document[member].append(record)
+    return document
+
+def build_shard(shard_dir, out_path, quarter):
+    """Sort-merge the four members of one shard into a gzip NDJSON file of filing documents.
+
+    Runs in a worker process; only one shard (~1/JSON_SHARD_COUNT of the quarter) is in
+    memory at a time. Returns (out_path, document_count).
+    """
+    streams = [
+        sorted_member_rows(os.path.join(shard_dir, member), member.replace('.txt', ''))
+        for member in JSON_MEMBERS
+    ]
+    documents = 0
+    with gzip.open(out_path, 'wt', encoding='utf-8') as out:
+        merged = heapq.merge(*streams, key=lambda row: row[0])
+        for adsh, rows in groupby(merged, key=lambda row: row[0]):
+            out.write(json.dumps(filing_document(adsh, quarter, rows), separators=(',', ':')) + '\n')
+            documents += 1
+    return out_path, documents
+
+def build_shards(jobs, max_workers=None):
+    """Run build_shard for each (shard_dir, out_path, quarter) job in worker processes, in order.
+
+    LocalExecutor runs tasks in daemonic processes, which multiprocessing does not allow
+    to have children; there the shards are built with billiard (Celery's fork of
+    multiprocessing, installed with the Airflow image), or in-process without it.
+    """
+    if not multiprocessing.current_process().daemon:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            yield from executor.map(build_shard, *zip(*jobs))
+        return
+    try:
+        import billiard
+    except ImportError:
+        logger.warning("Running in a daemonic process without billiard, building shards in-process")
+        for job in jobs:
+            yield build_shard(*job)
+        return
+    pool = billiard.Pool(processes=max_workers)
+    try:
+        yield from pool.starmap(build_shard, jobs)
+    finally:
+        pool.terminate()
+        pool.join()
+
+def build_filing_documents(year, quarter, bucket_name="sec-finance-data-team1", shard_count=JSON_SHARD_COUNT,
+                           max_workers=None, **context):
+    """Build one nested JSON document per filing and write them to S3 as NDJSON shards"""
+    period = f"{year}q{quarter}"
+    work_dir = f"/tmp/sec_json/{period}"
+    try:
+        s3_client = get_s3_client()
+        partition_dir = os.path.join(work_dir, 'partitions')
+        shard_out_dir = os.path.join(work_dir, 'shards')
+        os.makedirs(shard_out_dir, exist_ok=True)
+
+        # Stream every member out of the archived ZIP once, partitioning rows by adsh
+        for member in JSON_MEMBERS:
+            with open_raw_member(s3_client, bucket_name, period, member) as (source, _):
+                rows = partition_member(iter_lines(read_chunks(source, READ_CHUNK_SIZE)), member, partition_dir, shard_count)
+            logger.info(f"Partitioned {rows} rows of {member} into {shard_count} shards")
+
+        # Sort-merge shards in parallel worker processes
+        jobs = [
+            (
+                os.path.join(partition_dir, f"{shard:04d}"),
+                os.path.join(shard_out_dir, f"filings_{shard:04d}.ndjson.gz"),
+                period
+            )
+            for shard in range(shard_count)
+        ]
+        shard_paths = []
+        for out_path, documents in build_shards(jobs, max_workers):
+            logger.info(f"Built {documents} filing documents in {out_path}")
+            shard_paths.append(out_path)
+
+        # Upload shards
+        def upload(path):
+            key = f"sec_data/{period}/json/{os.path.basename(path)}"
+            s3_client.upload_file(path, bucket_name, key)
+            return key
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            keys = list(executor.map(upload, shard_paths))
+
+        logger.info(f"Uploaded {len(keys)} NDJSON shards to s3://{bucket_name}/sec_data/{period}/json/")
+        return keys
+
+    except Exception as e:
+        logger.error(f"Error building filing documents: {str(e)}")
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+JSON_TABLE = 'FILINGS_JSON'
+JSON_STAGE_NAME = 'sec_json_s3_stage'
+
+def load_json_to_snowflake(year, quarter, database='ASSIGNMENT2_TEAM1', schema='JSON_STAGING',
+                           bucket_name="sec-finance-data-team1", storage_integration=None, force=False, **context):
+    """Bulk load a quarter's NDJSON filing shards into a VARIANT table with one COPY.
+
+    Shards are read from an external stage over the S3 prefix they were written to,
+    so nothing is inserted row by row. The load ledger keeps a combined hash of the
+    shard ETags; an unchanged quarter is skipped and a changed one is replaced.
+    """
+    period = f"{year}q{quarter}"
+    conn = None
+    try:
+        if isinstance(force, str):
+            force = force.lower() == 'true'
+
+        s3_client = get_s3_client()
+        prefix = f"sec_data/{period}/json/"
+        shards = []
+        for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket_name, Prefix=prefix):
+            shards.extend(obj for obj in page.get('Contents', []) if obj['Key'].endswith('.ndjson.gz'))
+        if not shards:
+            raise ValueError(f"No NDJSON shards found under s3://{bucket_name}/{prefix}")
+        shards_hash = hashlib.sha256(
+            ''.join(f"{obj['Key']}:{obj['ETag']}" for obj in sorted(shards, key=lambda obj: obj['Key'])).encode('utf-8')
+        ).hexdigest()
+
+        conn = acquire_snowflake_connection()
         cursor = conn.cursor()
-        
-        # Your JSON loading logic here
-        print("Loading JSON data to Snowflake")
-        
+        cursor.execute(f"USE DATABASE {database}")
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+        cursor.execute(f"USE SCHEMA {schema}")
+        ensure_ledger_table(cursor)
+
+        if not force and quarter_is_current(cursor, period, {JSON_TABLE: shards_hash}):
+            logger.info(f"JSON shards for {period} already loaded, skipping")
+            raise AirflowSkipException(f"{period} JSON shards unchanged")
+
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {JSON_TABLE} (
+            adsh VARCHAR,
+            quarter VARCHAR,
+            sub VARIANT,
+            num VARIANT,
+            pre VARIANT,
+            tag VARIANT
+        )
+        """)
+        create_external_stage(cursor, bucket_name, get_aws_connection(), storage_integration,
+                              stage_name=JSON_STAGE_NAME, file_format=None)
+        # The query API watches the data version table next to the raw tables; DDL
+        # commits implicitly, so it must not run inside the replace transaction
+        data_version_table = f"{database}.{RAW_SCHEMA}.{DATA_VERSION_TABLE}"
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {database}.{RAW_SCHEMA}")
+        ensure_data_version_table(cursor, data_version_table)
+
+        # Replace the quarter with one COPY over all its shards
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute(f"DELETE FROM {JSON_TABLE} WHERE quarter = %s", (period,))
+            cursor.execute(f"""
+            COPY INTO {JSON_TABLE}
+            FROM @{JSON_STAGE_NAME}/{period}/json/
+            PATTERN = '.*filings_[0-9]+[.]ndjson[.]gz'
+            FILE_FORMAT = (TYPE = JSON COMPRESSION = GZIP STRIP_OUTER_ARRAY = TRUE)
+            MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE
+            FORCE = TRUE
+            ON_ERROR = 'ABORT_STATEMENT'
+            """)
+            rows_parsed, rows_loaded = copy_result_counts(cursor)
+            record_load(cursor, period, JSON_TABLE, prefix, shards_hash, rows_parsed, rows_loaded, 'LOADED')
+            publish_data_version(cursor, 'load_json_to_snowflake', period, data_version_table)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+
+        logger.info(f"Loaded {rows_loaded} filing documents from {len(shards)} shards for {period}")
         cursor.close()
-        conn.close()
-        
+        return {'quarter': period, 'shards': len(shards), 'rows_loaded': rows_loaded}
+
+    except AirflowSkipException:
+        raise
     except Exception as e:
-        print(f"Error loading JSON to Snowflake: {str(e)}")
+        logger.error(f"Error loading JSON to Snowflake: {str(e)}")
         raise
+    finally:
+        release_snowflake_connection(conn)
+
+def table_columns(cursor, table_name):
+    """Data columns of a raw table in load order, without the quarter partition column"""
+    cursor.execute(f"DESCRIBE TABLE {table_name}")
+    return [row[0] for row in cursor.fetchall() if row[0].upper() != 'QUARTER']
+
+def warehouse_fingerprint(conn, table_name, columns, period):
+    """Row count and content hash of one quarter of a table, computed in Snowflake"""
+    row_text = ", ".join(f"COALESCE(TO_VARCHAR({column}), '')" for column in columns)
+    digits = 'X' * FINGERPRINT_HEX_DIGITS
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+        SELECT
+            COUNT(*),
+            COALESCE(SUM(TO_NUMBER(SUBSTR(MD5(CONCAT_WS('\t', {row_text})), 1, {FINGERPRINT_HEX_DIGITS}), '{digits}')), 0)
+        FROM {table_name}
+        WHERE quarter = %s
+        """, (period,))
+        rows, content_hash = cursor.fetchone()
+    return int(rows), int(content_hash)
+
+def verify_data_load(year, quarter, database='ASSIGNMENT2_TEAM1', schema='RAW_STAGING', json_schema='JSON_STAGING',
+                     bucket_name="sec-finance-data-team1", **context):
+    """Verify every raw table of a quarter against its source file, and the JSON table against RAW_SUB.
 
-def verify_data_load():
-    """Verify data was loaded correctly"""
+    Source row counts and fingerprints come from the profiles validate_raw_files
+    computed while streaming the files, so nothing is read from S3 again; only the
+    warehouse aggregates run here, one query per table, concurrently.
+    """
+    from raw import RAW_TABLES
+
+    period = f"{year}q{quarter}"
+    conn = None
     try:
-        conn = connect(
-            user='dev_dhrumil_user',
-            password='Dhrumil@123',
-            account='tr28614.us-east4.gcp',
-            warehouse='COMPUTE_WH',
-            database='assignment2_team1',
-            schema='raw_staging'
-        )
-        
+        profiles = load_profiles(get_s3_client(), bucket_name, period)
+        source = {}
+        for table_name, filename in RAW_TABLES.items():
+            profile = profiles[filename]
+            if 'content_hash' not in profile:
+                raise ValueError(f"Profile of {filename} for {period} has no content hash; re-run validate_raw_files")
+            source[table_name] = (profile['rows'], profile['content_hash'])
+
+        conn = acquire_snowflake_connection()
         cursor = conn.cursor()
+        cursor.execute(f"USE DATABASE {database}")
+        cursor.execute(f"USE SCHEMA {schema}")
+        columns = {}
+        for table_name, filename in RAW_TABLES.items():
+            # The COPY fills the leading columns from the file's fields
+            width = len(profiles[filename]['columns'])
+            columns[table_name] = table_columns(cursor, table_name)[:width]
+            if len(columns[table_name]) < width:
+                raise ValueError(f"{table_name} has fewer columns than {filename} ({width})")
         
-        # Add verification queries here
-        print("Verifying data load")
+        with ThreadPoolExecutor(max_workers=len(RAW_TABLES) + 1) as executor:
+            warehouse = {
+                table_name: executor.submit(warehouse_fingerprint, conn, table_name, columns[table_name], period)
+                for table_name in RAW_TABLES
+            }
+
+            def json_filing_count():
+                with conn.cursor() as json_cursor:
+                    json_cursor.execute(
+                        f"SELECT COUNT(*) FROM {database}.{json_schema}.{JSON_TABLE} WHERE quarter = %s", (period,)
+                    )
+                    return json_cursor.fetchone()[0]
+
+            json_count = executor.submit(json_filing_count)
+
+            results = {}
+            mismatches = []
+            for table_name in RAW_TABLES:
+                source_rows, source_hash = source[table_name]
+                loaded_rows, loaded_hash = warehouse[table_name].result()
+                results[table_name] = {
+                    'source_rows': source_rows,
+                    'loaded_rows': loaded_rows,
+                    'hash_match': source_hash == loaded_hash
+                }
+                if source_rows != loaded_rows or source_hash != loaded_hash:
+                    mismatches.append(f"{table_name}: {loaded_rows}/{source_rows} rows, hash match {source_hash == loaded_hash}")
+                logger.info(f"{table_name} {period}: {results[table_name]}")
+
+            filings = json_count.result()
+            results[JSON_TABLE] = {'filings': filings, 'sub_rows': results['RAW_SUB']['loaded_rows']}
+            if filings != results['RAW_SUB']['loaded_rows']:
+                mismatches.append(f"{JSON_TABLE}: {filings} filings for {results['RAW_SUB']['loaded_rows']} RAW_SUB rows")
         
         cursor.close()
-        conn.close()
+        if mismatches:
+            raise ValueError(f"Verification failed for {period}: " + "; ".join(mismatches))
+        
+        logger.info(f"Verified {period}: all tables match their sources")
+        return results
         
     except Exception as e:
-        print(f"Error verifying data load: {str(e)}")
-        raise
\ No newline at end of file
+        logger.error(f"Error verifying data load: {str(e)}")
+        raise
+    finally:
+        release_snowflake_connection(conn)
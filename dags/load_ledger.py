@@ -0,0 +1,115 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# One row per (quarter, table): which file was loaded, its hash and the COPY outcome.
+# STAGED marks a table whose COPY into its quarter staging table finished; a retry
+# reuses it instead of loading the file again. LOADED means it was swapped in.
+LEDGER_TABLE = 'LOAD_LEDGER'
+
+def ensure_ledger_table(cur):
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS {LEDGER_TABLE} (
+        quarter VARCHAR,
+        table_name VARCHAR,
+        file_name VARCHAR,
+        file_hash VARCHAR,
+        rows_parsed NUMBER,
+        rows_loaded NUMBER,
+        status VARCHAR,
+        loaded_at TIMESTAMP_LTZ
+    )
+    """)
+
+# Append-only log of published data versions. The query API watches this table's last
+# commit time and drops its result cache when the ingest or dbt pipeline publishes.
+DATA_VERSION_TABLE = 'DATA_VERSION'
+
+def ensure_data_version_table(cur, table=DATA_VERSION_TABLE):
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        source VARCHAR,
+        detail VARCHAR,
+        published_at TIMESTAMP_LTZ
+    )
+    """)
+
+def publish_data_version(cur, source, detail=None, table=DATA_VERSION_TABLE):
+    """Record that source changed the data; may run inside the caller's transaction.
+
+    table must name the RAW_STAGING table (qualified when another schema is current).
+    """
+    cur.execute(
+        f"INSERT INTO {table} (source, detail, published_at) VALUES (%s, %s, CURRENT_TIMESTAMP())",
+        (source, detail)
+    )
+    logger.info(f"Published data version from {source} ({detail})")
+
+def loaded_hashes(cur, quarter):
+    """Return {table_name: file_hash} of the successful loads recorded for a quarter"""
+    cur.execute(
+        f"SELECT table_name, file_hash FROM {LEDGER_TABLE} WHERE quarter = %s AND status = 'LOADED'",
+        (quarter,)
+    )
+    return {table_name: file_hash for table_name, file_hash in cur.fetchall()}
+
+def staged_counts(cur, quarter, file_hashes):
+    """Return {table_name: (rows_parsed, rows_loaded)} of tables staged from files with these hashes"""
+    cur.execute(
+        f"SELECT table_name, file_hash, rows_parsed, rows_loaded FROM {LEDGER_TABLE} WHERE quarter = %s AND status = 'STAGED'",
+        (quarter,)
+    )
+    return {
+        table_name: (rows_parsed, rows_loaded)
+        for table_name, file_hash, rows_parsed, rows_loaded in cur.fetchall()
+        if file_hashes.get(table_name) == file_hash
+    }
+
+def quarter_is_current(cur, quarter, file_hashes):
+    """True if every table of the quarter was already loaded from files with these hashes"""
+    recorded = loaded_hashes(cur, quarter)
+    return all(recorded.get(table_name) == file_hash for table_name, file_hash in file_hashes.items())
+
+def record_load(cur, quarter, table_name, file_name, file_hash, rows_parsed, rows_loaded, status):
+    """Insert or update the ledger row for one (quarter, table)"""
+    cur.execute(f"""
+    MERGE INTO {LEDGER_TABLE} l
+    USING (SELECT %s AS quarter, %s AS table_name) s
+    ON l.quarter = s.quarter AND l.table_name = s.table_name
+    WHEN MATCHED THEN UPDATE SET
+        file_name = %s, file_hash = %s, rows_parsed = %s, rows_loaded = %s,
+        status = %s, loaded_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT
+        (quarter, table_name, file_name, file_hash, rows_parsed, rows_loaded, status, loaded_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP())
+    """, (
+        quarter, table_name,
+        file_name, file_hash, rows_parsed, rows_loaded, status,
+        quarter, table_name, file_name, file_hash, rows_parsed, rows_loaded, status
+    ))
+    logger.info(f"Ledger {quarter}/{table_name}: {status} ({rows_loaded}/{rows_parsed} rows, hash={file_hash})")
+
+def record_failure(cur, quarter, table_name, file_name):
+    """Record a failed load, keeping a LOADED row since the table still holds that data"""
+    cur.execute(f"""
+    MERGE INTO {LEDGER_TABLE} l
+    USING (SELECT %s AS quarter, %s AS table_name) s
+    ON l.quarter = s.quarter AND l.table_name = s.table_name
+    WHEN MATCHED AND l.status <> 'LOADED' THEN UPDATE SET
+        file_name = %s, file_hash = NULL, rows_parsed = NULL, rows_loaded = NULL,
+        status = 'FAILED', loaded_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT
+        (quarter, table_name, file_name, file_hash, rows_parsed, rows_loaded, status, loaded_at)
+        VALUES (%s, %s, %s, NULL, NULL, NULL, 'FAILED', CURRENT_TIMESTAMP())
+    """, (quarter, table_name, file_name, quarter, table_name, file_name))
+    logger.info(f"Ledger {quarter}/{table_name}: FAILED")
+
+def copy_result_counts(cur):
+    """Sum rows_parsed/rows_loaded over the per-file result rows of a COPY"""
+    columns = [desc[0].lower() for desc in cur.description]
+    rows_parsed = rows_loaded = 0
+    for row in cur.fetchall():
+        result = dict(zip(columns, row))
+        rows_parsed += int(result.get('rows_parsed') or 0)
+        rows_loaded += int(result.get('rows_loaded') or 0)
+    return rows_parsed, rows_loaded
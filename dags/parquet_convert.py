@@ -0,0 +1,207 @@
+import logging
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+from pyarrow import fs
+from connections import get_aws_connection, AWS_REGION
+from raw_layout import raw_member_key
+
+logger = logging.getLogger(__name__)
+
+# Each record batch read from a TSV is roughly this many bytes of input, so memory
+# stays bounded no matter how large the quarter is
+PARQUET_BLOCK_SIZE = 16 * 1024 * 1024
+PARQUET_COMPRESSION = 'zstd'
+
+DICT_STRING = pa.dictionary(pa.int32(), pa.string())
+
+# Column types per SEC member; columns not listed here are read as strings
+TSV_SCHEMAS = {
+    'num.txt': {
+        'adsh': pa.string(),
+        'tag': DICT_STRING,
+        'version': DICT_STRING,
+        'coreg': pa.string(),
+        'ddate': pa.date32(),
+        'qtrs': pa.int32(),
+        'uom': DICT_STRING,
+        'segments': pa.string(),
+        'value': pa.decimal128(38, 10),
+        'footnote': pa.string(),
+    },
+    'pre.txt': {
+        'adsh': pa.string(),
+        'report': pa.int32(),
+        'line': pa.int32(),
+        'stmt': DICT_STRING,
+        'inpth': pa.int8(),
+        'rfile': pa.string(),
+        'tag': DICT_STRING,
+        'version': DICT_STRING,
+        'plabel': pa.string(),
+        'negating': pa.int8(),
+    },
+    'sub.txt': {
+        'adsh': pa.string(),
+        'cik': pa.int64(),
+        'name': pa.string(),
+        'sic': pa.int32(),
+        **{name: pa.string() for name in [
+            'countryba', 'stprba', 'cityba', 'zipba', 'bas1', 'bas2', 'baph',
+            'countryma', 'stprma', 'cityma', 'zipma', 'mas1', 'mas2',
+            'countryinc', 'stprinc', 'ein', 'former', 'changed', 'afs', 'fye',
+            'accepted', 'instance', 'aciks'
+        ]},
+        'wksi': pa.int8(),
+        'form': DICT_STRING,
+        'period': pa.date32(),
+        'fy': pa.int32(),
+        'fp': DICT_STRING,
+        'filed': pa.date32(),
+        'prevrpt': pa.int8(),
+        'detail': pa.int8(),
+        'nciks': pa.int32(),
+    },
+    'tag.txt': {
+        'tag': DICT_STRING,
+        'version': DICT_STRING,
+        'custom': pa.int8(),
+        'abstract': pa.int8(),
+        'datatype': DICT_STRING,
+        'iord': DICT_STRING,
+        'crdr': DICT_STRING,
+        'tlabel': pa.string(),
+        'doc': pa.string(),
+    },
+}
+
+def read_column_types(filename):
+    """CSV reader types: SEC dates are YYYYMMDD, so they are parsed as timestamps first"""
+    return {
+        name: pa.timestamp('s') if arrow_type == pa.date32() else arrow_type
+        for name, arrow_type in TSV_SCHEMAS[filename].items()
+    }
+
+def cast_batch(batch, filename):
+    """Turn parsed timestamps into DATE columns"""
+    schema = TSV_SCHEMAS[filename]
+    columns = []
+    for name, column in zip(batch.schema.names, batch.columns):
+        if schema.get(name) == pa.date32():
+            column = pc.cast(column, pa.date32())
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+class HeaderPeekStream:
+    """Read-only stream that reads the TSV header line up front.
+
+    Knowing every column name before the CSV reader starts lets us pin unknown
+    columns to strings instead of trusting type inference on the first block.
+    """
+
+    def __init__(self, source, peek_size=64 * 1024):
+        self.source = source
+        buffer = b''
+        while b'\n' not in buffer:
+            chunk = source.read(peek_size)
+            if not chunk:
+                break
+            buffer += bytes(chunk)
+        header, _, self.pending = buffer.partition(b'\n')
+        self.column_names = header.decode('utf-8').rstrip('\r').split('\t')
+        self.closed = False
+
+    def read(self, size=-1):
+        if self.pending:
+            if size is None or size < 0 or size >= len(self.pending):
+                data, self.pending = self.pending, b''
+            else:
+                data, self.pending = self.pending[:size], self.pending[size:]
+            return data
+        return bytes(self.source.read(size))
+
+    def readable(self):
+        return True
+
+    def close(self):
+        self.closed = True
+
+def convert_tsv_stream(source, sink, filename, block_size=PARQUET_BLOCK_SIZE):
+    """Stream one SEC TSV from source into a compressed Parquet file at sink.
+
+    Rows with the wrong number of fields are skipped, mirroring ON_ERROR = 'CONTINUE'
+    in the Snowflake COPY. Returns (rows_written, rows_skipped).
+    """
+    skipped = []
+
+    def skip_row(row):
+        skipped.append(row.number)
+        return 'skip'
+
+    stream = HeaderPeekStream(source)
+    column_types = read_column_types(filename)
+    for name in stream.column_names:
+        column_types.setdefault(name, pa.string())
+
+    reader = pv.open_csv(
+        stream,
+        read_options=pv.ReadOptions(block_size=block_size, column_names=stream.column_names),
+        # SEC files are tab separated and never quoted
+        parse_options=pv.ParseOptions(delimiter='\t', quote_char=False, invalid_row_handler=skip_row),
+        convert_options=pv.ConvertOptions(
+            column_types=column_types,
+            timestamp_parsers=['%Y%m%d'],
+            strings_can_be_null=True
+        )
+    )
+
+    dictionary_columns = [name for name, arrow_type in TSV_SCHEMAS[filename].items() if arrow_type == DICT_STRING]
+    rows = 0
+    writer = None
+    try:
+        for batch in reader:
+            batch = cast_batch(batch, filename)
+            if writer is None:
+                writer = pq.ParquetWriter(
+                    sink,
+                    batch.schema,
+                    compression=PARQUET_COMPRESSION,
+                    use_dictionary=[name for name in dictionary_columns if name in batch.schema.names]
+                )
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return rows, len(skipped)
+
+def convert_to_parquet(year, quarter, bucket_name="sec-finance-data-team1", **context):
+    """Convert the raw TSVs of a quarter in S3 to typed Parquet next to them"""
+    try:
+        aws_conn = get_aws_connection()
+        s3 = fs.S3FileSystem(
+            access_key=aws_conn.login,
+            secret_key=aws_conn.password,
+            region=AWS_REGION
+        )
+
+        results = {}
+        for filename in TSV_SCHEMAS:
+            raw_path = f"{bucket_name}/{raw_member_key(f'{year}q{quarter}', filename)}"
+            parquet_path = f"{bucket_name}/sec_data/{year}q{quarter}/parquet/{filename.replace('.txt', '.parquet')}"
+            logger.info(f"Converting {raw_path} to {parquet_path}")
+
+            # compression='detect' decompresses .gz/.zst objects of the partitioned layout
+            with s3.open_input_stream(raw_path, compression='detect') as source, s3.open_output_stream(parquet_path) as sink:
+                rows, skipped = convert_tsv_stream(source, sink, filename)
+
+            logger.info(f"Wrote {rows} rows to {parquet_path} ({skipped} malformed rows skipped)")
+            results[filename] = {'path': f"s3://{parquet_path}", 'rows': rows, 'skipped': skipped}
+
+        return results
+
+    except Exception as e:
+        logger.error(f"Error in convert_to_parquet: {str(e)}")
+        raise
@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import logging
+import resource
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# node_exporter textfile collector directory; metrics files are skipped when unset
+METRICS_TEXTFILE_DIR = os.getenv('SEC_METRICS_TEXTFILE_DIR')
+METRICS_PREFIX = 'sec_pipeline'
+
+class RSSSampler:
+    """Track the peak resident set size of this process while a block runs"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current_rss():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except OSError:
+            # ru_maxrss is KB on Linux, bytes on macOS; only a process-wide upper bound
+            scale = 1 if sys.platform == 'darwin' else 1024
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current_rss())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = self.current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current_rss())
+
+class PipelineMetrics:
+    """Collects per-stage timings, bytes, rows and memory for one task.
+
+    Stages may run in worker threads; publish() is called once from the task itself
+    to push everything to XCom and to the metrics sinks.
+    """
+
+    def __init__(self, task, **labels):
+        self.task = task
+        self.labels = labels
+        self.records = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **labels):
+        """Time a stage; the yielded dict takes bytes, rows_loaded and rows_rejected"""
+        record = {'stage': name, **self.labels, **labels, 'bytes': 0, 'rows_loaded': 0, 'rows_rejected': 0}
+        status = 'success'
+        sampler = RSSSampler()
+        start = time.perf_counter()
+        try:
+            with sampler:
+                yield record
+        except Exception:
+            status = 'failed'
+            raise
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 3)
+            record['peak_rss_bytes'] = sampler.peak
+            record['status'] = status
+            with self._lock:
+                # In-task retries repeat a stage with the same labels; the attempt label
+                # keeps each one a separate Prometheus series
+                series = series_labels(record, 'status', 'attempt')
+                record['attempt'] = 1 + sum(
+                    1 for other in self.records if series_labels(other, 'status', 'attempt') == series
+                )
+                self.records.append(record)
+            try:
+                emit_statsd(record)
+            except Exception as e:
+                logger.warning(f"Could not send stage metrics to StatsD: {str(e)}")
+            logger.info(f"Stage metrics: {record}")
+
+    def publish(self, context=None):
+        """Push the collected stage metrics to XCom and write the Prometheus textfile"""
+        ti = (context or {}).get('ti')
+        if ti:
+            try:
+                ti.xcom_push(key='stage_metrics', value=self.records)
+            except Exception as e:
+                logger.warning(f"Could not push stage metrics to XCom: {str(e)}")
+        write_textfile(self.task, self.labels, self.records)
+
+def emit_statsd(record):
+    """Send a stage record through Airflow's StatsD client (no-op unless statsd_on is set)"""
+    try:
+        from airflow.stats import Stats
+    except ImportError:
+        return
+    stage = f"{METRICS_PREFIX}.{record['stage']}"
+    Stats.timing(f"{stage}.duration", record['seconds'] * 1000)
+    Stats.incr(f"{stage}.bytes", record['bytes'])
+    Stats.incr(f"{stage}.rows_loaded", record['rows_loaded'])
+    Stats.incr(f"{stage}.rows_rejected", record['rows_rejected'])
+    Stats.gauge(f"{stage}.peak_rss_bytes", record['peak_rss_bytes'])
+    if record['status'] != 'success':
+        Stats.incr(f"{stage}.failures")
+
+STAGE_VALUES = ('bytes', 'rows_loaded', 'rows_rejected', 'seconds', 'peak_rss_bytes')
+
+def series_labels(record, *exclude):
+    """The label pairs of a stage record, sorted, without its values"""
+    return sorted((key, value) for key, value in record.items() if key not in STAGE_VALUES + exclude)
+
+def prometheus_labels(record):
+    return ','.join(f'{key}="{str(value)}"' for key, value in series_labels(record))
+
+def write_textfile(task, labels, records):
+    if not METRICS_TEXTFILE_DIR or not records:
+        return
+    metrics = {
+        'seconds': 'Wall time of the stage',
+        'bytes': 'Bytes moved by the stage',
+        'rows_loaded': 'Rows loaded by the stage',
+        'rows_rejected': 'Rows rejected by the stage',
+        'peak_rss_bytes': 'Peak resident memory of the worker during the stage',
+    }
+    lines = []
+    for metric, help_text in metrics.items():
+        name = f"{METRICS_PREFIX}_stage_{metric}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for record in records:
+            lines.append(f"{name}{{{prometheus_labels(record)}}} {record[metric]}")
+
+    suffix = '_'.join(str(value) for value in labels.values())
+    path = os.path.join(METRICS_TEXTFILE_DIR, f"{METRICS_PREFIX}_{task}_{suffix}.prom")
+    try:
+        os.makedirs(METRICS_TEXTFILE_DIR, exist_ok=True)
+        with open(f"{path}.tmp", 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        logger.warning(f"Could not write metrics textfile {path}: {str(e)}")
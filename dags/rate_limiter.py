@@ -0,0 +1,96 @@
+import os
+import time
+import asyncio
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# SEC allows at most 10 requests/second per client; stay safely below it
+SEC_MAX_REQUESTS_PER_SECOND = float(os.getenv('SEC_MAX_REQUESTS_PER_SECOND', '8'))
+# Burst allowed on top of the steady rate. A full bucket plus one second of refill
+# must stay under SEC's limit, so capacity + rate <= 10.
+SEC_RATE_LIMIT_BURST = float(os.getenv('SEC_RATE_LIMIT_BURST', '1'))
+SEC_RATE_LIMIT_REDIS_URL = os.getenv('SEC_RATE_LIMIT_REDIS_URL', 'redis://redis:6379/1')
+# Processes that may fall back to a local bucket at the same time (the ingest DAG's
+# max_active_tasks); each local bucket gets this share of the rate
+SEC_RATE_LIMIT_LOCAL_SHARE = int(os.getenv('SEC_RATE_LIMIT_LOCAL_SHARE', '8'))
+
+# Reserve one token atomically and return how long the caller must wait for it.
+# Uses the Redis server clock so workers on different hosts agree on time.
+TOKEN_BUCKET_LUA = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate) - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], 60)
+if tokens >= 0 then
+    return '0'
+end
+return tostring(-tokens / rate)
+"""
+
+class TokenBucket:
+    """Token bucket shared by every worker through Redis.
+
+    Falls back to a process-local bucket when Redis is not reachable. Every worker
+    may fall back at once, so the local bucket only gets 1/local_share of the rate
+    and no burst, keeping the combined rate within the limit.
+    """
+
+    def __init__(self, key, rate, capacity=SEC_RATE_LIMIT_BURST, redis_url=SEC_RATE_LIMIT_REDIS_URL,
+                 local_share=SEC_RATE_LIMIT_LOCAL_SHARE):
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+        self.redis_url = redis_url
+        self.local_rate = rate / max(1, local_share)
+        self._script = None
+        self._lock = threading.Lock()
+        self._tokens = 1
+        self._ts = time.monotonic()
+        self._redis_retry_at = 0.0
+
+    def _get_script(self):
+        if self._script is None:
+            import redis
+            client = redis.Redis.from_url(self.redis_url, socket_timeout=2)
+            self._script = client.register_script(TOKEN_BUCKET_LUA)
+        return self._script
+
+    def _reserve_local(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(1, self._tokens + (now - self._ts) * self.local_rate) - 1
+            self._ts = now
+            return max(0.0, -self._tokens / self.local_rate)
+
+    def _reserve(self):
+        if time.monotonic() < self._redis_retry_at:
+            return self._reserve_local()
+        try:
+            return float(self._get_script()(keys=[self.key], args=[self.rate, self.capacity]))
+        except Exception as e:
+            logger.warning(f"Shared rate limiter unavailable, using local bucket: {str(e)}")
+            self._script = None
+            self._redis_retry_at = time.monotonic() + 60
+            return self._reserve_local()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Wait for a request slot without blocking the event loop (for triggers)"""
+        wait = await asyncio.to_thread(self._reserve)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+sec_rate_limiter = TokenBucket('sec_rate_limiter', SEC_MAX_REQUESTS_PER_SECOND)
@@ -1,27 +1,173 @@
 import requests
 from bs4 import BeautifulSoup
 import os
-import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
 import time
-import pandas as pd
 from zipfile import ZipFile
 import logging
 import urllib3
-from airflow.hooks.base import BaseHook
-from airflow.providers.snowflake.hooks.snowflake import SnowflakeHook
 import shutil
+import hashlib
+import gzip
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from airflow.exceptions import AirflowSkipException
+from rate_limiter import sec_rate_limiter
+from retries import backoff_delay, call_with_retries
+from pipeline_metrics import PipelineMetrics
+from connections import get_s3_client, get_aws_connection, acquire_snowflake_connection, release_snowflake_connection
+from load_ledger import (ensure_ledger_table, quarter_is_current, staged_counts, record_load, record_failure,
+                         copy_result_counts, ensure_data_version_table, publish_data_version)
+from fetch_manifest import load_manifest_entry, save_manifest_entry, conditional_headers
+from s3_zip import archive_key, open_raw_member, read_chunks
+from tsv_profiler import iter_lines
+from raw_layout import RAW_LAYOUT, RAW_COMPRESSION, raw_member_key, compressing_reader, write_partition_manifest
 
 logger = logging.getLogger(__name__)
 
-def download_sec_data(year, quarter, **context):
+RAW_BUCKET = "sec-finance-data-team1"
+
+# Size of each chunk written to disk while streaming the quarterly archive
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_MAX_ATTEMPTS = 5
+
+def file_sha256(path, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Compute the SHA-256 of a file without loading it into memory"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def stream_download(url, local_filename, headers, conditional=None, chunk_size=DOWNLOAD_CHUNK_SIZE, max_attempts=DOWNLOAD_MAX_ATTEMPTS):
+    """Stream url to local_filename in fixed-size chunks, resuming a partial file with Range requests.
+
+    Data is written to ``<local_filename>.part`` and only renamed into place once the
+    size matches what the server announced. ``conditional`` headers are sent on a fresh
+    request; a 304 response returns None. Otherwise returns a dict with size, sha256,
+    etag and last_modified of the finished file.
+    """
+    part_filename = f"{local_filename}.part"
+    # ETag of the partial file, so a resume never appends bytes of a newer archive
+    etag_filename = f"{part_filename}.etag"
+    expected_size = None
+    validators = {}
+
+    for attempt in range(1, max_attempts + 1):
+        offset = os.path.getsize(part_filename) if os.path.exists(part_filename) else 0
+        request_headers = dict(headers)
+        if offset:
+            request_headers['Range'] = f"bytes={offset}-"
+            if os.path.exists(etag_filename):
+                with open(etag_filename) as f:
+                    request_headers['If-Range'] = f.read().strip()
+            logger.info(f"Resuming download of {url} from byte {offset}")
+        elif conditional:
+            request_headers.update(conditional)
+
+        # Shared across all workers to stay under SEC's request rate cap
+        sec_rate_limiter.acquire()
+        try:
+            with requests.get(url, headers=request_headers, stream=True, allow_redirects=True, timeout=(10, 60)) as response:
+                logger.info(f"Download status code: {response.status_code}")
+
+                if response.status_code == 304:
+                    return None
+                if response.status_code == 416 and offset:
+                    # Partial file already holds the whole object
+                    expected_size = offset
+                    break
+                if response.status_code == 206:
+                    content_range = response.headers.get('Content-Range', '')
+                    total = content_range.rsplit('/', 1)[-1]
+                    expected_size = int(total) if total.isdigit() else None
+                    mode = 'ab'
+                elif response.status_code == 200:
+                    # Server ignored the Range header, start over from byte zero
+                    content_length = response.headers.get('Content-Length')
+                    expected_size = int(content_length) if content_length else None
+                    mode = 'wb'
+                else:
+                    raise ValueError(f"Download failed with status code: {response.status_code}")
+
+                validators = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                }
+                if validators['etag']:
+                    with open(etag_filename, 'w') as f:
+                        f.write(validators['etag'])
+
+                with open(part_filename, mode) as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            f.write(chunk)
+            break
+
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout) as e:
+            if attempt == max_attempts:
+                raise
+            logger.warning(f"Download interrupted (attempt {attempt}/{max_attempts}): {str(e)}")
+            time.sleep(backoff_delay(attempt))
+
+    size = os.path.getsize(part_filename)
+    if expected_size is not None and size != expected_size:
+        raise ValueError(f"Size mismatch for {local_filename}: expected {expected_size} bytes, got {size}")
+
+    sha256 = file_sha256(part_filename, chunk_size)
+    os.replace(part_filename, local_filename)
+    if os.path.exists(etag_filename):
+        os.remove(etag_filename)
+    return {'size': size, 'sha256': sha256, **validators}
+
+def plan_backfill_quarters(start_quarter, end_quarter, quarters=None, **context):
+    """Expand an inclusive quarter range like 2009q1..2023q4 into mapped task kwargs.
+
+    An explicit list of quarters (as sent by the release watcher) takes precedence
+    over the range.
+    """
+    def parse(period):
+        year, quarter = str(period).lower().split('q')
+        if int(quarter) not in (1, 2, 3, 4):
+            raise ValueError(f"Invalid quarter: {period}")
+        return int(year), int(quarter)
+
+    if isinstance(quarters, str):
+        import ast
+        quarters = ast.literal_eval(quarters) if quarters.strip() else None
+    if quarters:
+        planned = [{'year': str(year), 'quarter': str(quarter)} for year, quarter in sorted(set(map(parse, quarters)))]
+        logger.info(f"Planned {len(planned)} requested quarters: {quarters}")
+        return planned
+
+    start_year, start_q = parse(start_quarter)
+    end_year, end_q = parse(end_quarter)
+    if (start_year, start_q) > (end_year, end_q):
+        raise ValueError(f"start_quarter {start_quarter} is after end_quarter {end_quarter}")
+
+    quarters = []
+    year, quarter = start_year, start_q
+    while (year, quarter) <= (end_year, end_q):
+        quarters.append({'year': str(year), 'quarter': str(quarter)})
+        year, quarter = (year + 1, 1) if quarter == 4 else (year, quarter + 1)
+
+    logger.info(f"Planned {len(quarters)} quarters from {start_quarter} to {end_quarter}")
+    return quarters
+
+def download_sec_data(year, quarter, expected_sha256=None, force=False, **context):
     """Download SEC financial statement data sets"""
+    metrics = PipelineMetrics('download_sec_data', quarter=f"{year}q{quarter}")
     try:
         # Direct download URL
         download_url = f"https://www.sec.gov/files/dera/data/financial-statement-data-sets/{year}q{quarter}.zip"
         
         headers = {
             'User-Agent': 'Sample Company Name AdminContact@company.com',
-            'Accept-Encoding': 'gzip, deflate',
+            # Byte ranges must refer to the archive itself, not a compressed transfer
+            'Accept-Encoding': 'identity',
             'Host': 'www.sec.gov'
         }
         
@@ -33,48 +179,123 @@ def download_sec_data(year, quarter, **context):
         # Download file
         local_filename = f"./data/financial_statement_data_sets/{year}q{quarter}.zip"
         
-        # Add delay to respect SEC rate limits
-        time.sleep(0.1)
+        # Skip quarters SEC hasn't changed since the last successful ingest
+        if isinstance(force, str):
+            force = force.lower() == 'true'
+        s3_client = get_s3_client()
+        manifest_entry = None if force else load_manifest_entry(s3_client, RAW_BUCKET, year, quarter)
         
-        response = requests.get(
-            download_url, 
-            headers=headers,
-            allow_redirects=True
-        )
+        with metrics.stage('download') as stage:
+            archive = stream_download(download_url, local_filename, headers, conditional=conditional_headers(manifest_entry))
+            stage['bytes'] = archive['size'] if archive else 0
         
-        logger.info(f"Download status code: {response.status_code}")
+        if archive is None:
+            logger.info(f"{year}q{quarter}.zip not modified since last ingest (304), skipping")
+            raise AirflowSkipException(f"{year}q{quarter} unchanged")
         
-        if response.status_code == 200:
-            with open(local_filename, 'wb') as f:
-                f.write(response.content)
-            logger.info(f"Successfully downloaded {year}q{quarter}.zip")
-            return [[local_filename, f"{year}q{quarter}.zip"]]
-        else:
-            raise ValueError(f"Download failed with status code: {response.status_code}")
+        size, sha256 = archive['size'], archive['sha256']
+        
+        if expected_sha256 and sha256 != expected_sha256:
+            os.remove(local_filename)
+            raise ValueError(f"Hash mismatch for {year}q{quarter}.zip: expected {expected_sha256}, got {sha256}")
+        
+        if manifest_entry and manifest_entry.get('sha256') == sha256:
+            logger.info(f"{year}q{quarter}.zip content unchanged (sha256={sha256}), skipping")
+            os.remove(local_filename)
+            save_manifest_entry(s3_client, RAW_BUCKET, year, quarter, archive)
+            raise AirflowSkipException(f"{year}q{quarter} unchanged")
+        
+        logger.info(f"Successfully downloaded {year}q{quarter}.zip ({size} bytes, sha256={sha256})")
+        
+        ti = context.get('ti')
+        if ti:
+            ti.xcom_push(key='archive_size', value=size)
+            ti.xcom_push(key='archive_sha256', value=sha256)
+        
+        # The manifest is only written by record_fetch_manifest, once the quarter is
+        # loaded and verified; until then every run downloads and loads it again
+        return [[local_filename, f"{year}q{quarter}.zip", archive]]
             
+    except AirflowSkipException:
+        raise
     except Exception as e:
         logger.error(f"Error downloading SEC data: {str(e)}")
         raise
+    finally:
+        metrics.publish(context)
+
+# Multipart settings for streaming ZIP members to S3: each member holds at most
+# UPLOAD_MAX_CONCURRENCY parts of UPLOAD_PART_SIZE bytes in memory at once
+UPLOAD_PART_SIZE = 16 * 1024 * 1024
+UPLOAD_MAX_CONCURRENCY = 4
+RAW_MEMBERS = ['num.txt', 'pre.txt', 'sub.txt', 'tag.txt']
+
+# S3 object metadata naming the archive an object came from; an upload retry skips
+# objects that already carry the current archive's hash
+ARCHIVE_SHA256_METADATA = 'archive-sha256'
+
+def uploaded_from_archive(s3_client, bucket_name, s3_key, sha256):
+    """True if s3_key was already uploaded from the archive with this sha256"""
+    if not sha256:
+        return False
+    try:
+        head = s3_client.head_object(Bucket=bucket_name, Key=s3_key)
+    except ClientError:
+        return False
+    return head.get('Metadata', {}).get(ARCHIVE_SHA256_METADATA) == sha256
+
+def stream_member_to_s3(s3_client, zip_path, filename, bucket_name, period, transfer_config, metrics, sha256=None,
+                        layout=RAW_LAYOUT, compression=RAW_COMPRESSION):
+    """Stream one ZIP member straight into a multipart S3 upload, without a temp file.
+
+    In the partitioned layout the member is compressed on the fly and its partition
+    manifest is written once the upload completes.
+    """
+    s3_key = raw_member_key(period, filename, layout, compression)
+    if uploaded_from_archive(s3_client, bucket_name, s3_key, sha256):
+        logger.info(f"{s3_key} already uploaded from this archive, reusing it")
+        return s3_key
+    extra_args = {'Metadata': {ARCHIVE_SHA256_METADATA: sha256}} if sha256 else None
+    # Extraction, compression and upload are one stream, so they are measured as one stage
+    with metrics.stage('extract_upload', member=filename) as stage:
+        # Each thread opens its own handle so members decompress independently
+        with ZipFile(zip_path) as zip_file, zip_file.open(filename) as source:
+            stage['bytes'] = zip_file.getinfo(filename).file_size
+            if layout == 'partitioned':
+                reader = compressing_reader(source, compression)
+                s3_client.upload_fileobj(reader, bucket_name, s3_key, ExtraArgs=extra_args, Config=transfer_config)
+                write_partition_manifest(s3_client, bucket_name, period, filename, s3_key, reader.bytes_in, sha256)
+            else:
+                s3_client.upload_fileobj(source, bucket_name, s3_key, ExtraArgs=extra_args, Config=transfer_config)
+    logger.info(f"Successfully uploaded {filename} to S3: {s3_key}")
+    return s3_key
+
+def archive_to_s3(s3_client, zip_path, bucket_name, s3_key, transfer_config, metrics, sha256=None):
+    """Keep the original ZIP in S3 so later tasks can range-read single members"""
+    if uploaded_from_archive(s3_client, bucket_name, s3_key, sha256):
+        logger.info(f"{s3_key} already archived, reusing it")
+        return s3_key
+    extra_args = {'Metadata': {ARCHIVE_SHA256_METADATA: sha256}} if sha256 else None
+    with metrics.stage('archive_upload') as stage:
+        stage['bytes'] = os.path.getsize(zip_path)
+        s3_client.upload_file(zip_path, bucket_name, s3_key, ExtraArgs=extra_args, Config=transfer_config)
+    logger.info(f"Successfully archived {zip_path} to S3: {s3_key}")
+    return s3_key
 
 def upload_to_s3(downloaded_files, year, quarter, **context):
     """Upload zip and extracted files to S3"""
+    metrics = PipelineMetrics('upload_to_s3', quarter=f"{year}q{quarter}")
     try:
         logger.info(f"Starting upload_to_s3 with downloaded_files: {downloaded_files}")
         
-        bucket_name = "sec-finance-data-team1"
-        temp_dir = "/tmp/sec_data"
-        
-        # Create temp directory
-        os.makedirs(temp_dir, mode=0o777, exist_ok=True)
-        logger.info(f"Created temp directory: {temp_dir}")
+        bucket_name = RAW_BUCKET
         
         # Create S3 client
-        aws_conn = BaseHook.get_connection('aws_default')
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=aws_conn.login,
-            aws_secret_access_key=aws_conn.password,
-            region_name='us-east-1'
+        s3_client = get_s3_client()
+        transfer_config = TransferConfig(
+            multipart_threshold=UPLOAD_PART_SIZE,
+            multipart_chunksize=UPLOAD_PART_SIZE,
+            max_concurrency=UPLOAD_MAX_CONCURRENCY
         )
         
         # Handle the downloaded_files parameter
@@ -83,149 +304,379 @@ def upload_to_s3(downloaded_files, year, quarter, **context):
             downloaded_files = ast.literal_eval(downloaded_files)
         
         zip_path = downloaded_files[0][0]
+        sha256 = downloaded_files[0][2].get('sha256') if len(downloaded_files[0]) > 2 else None
         logger.info(f"Processing zip file: {zip_path}")
         
-        # Extract and upload files
-        with ZipFile(zip_path) as zip_file:
-            for filename in ['num.txt', 'pre.txt', 'sub.txt', 'tag.txt']:
+        # Upload all four members and the archive itself at the same time. Each one is
+        # retried on its own and objects finished by an earlier attempt are kept.
+        with ThreadPoolExecutor(max_workers=len(RAW_MEMBERS) + 1) as executor:
+            futures = {
+                executor.submit(
+                    call_with_retries, stream_member_to_s3, s3_client, zip_path, filename, bucket_name,
+                    f"{year}q{quarter}", transfer_config, metrics, sha256,
+                    description=f"Upload of {filename}"
+                ): filename
+                for filename in RAW_MEMBERS
+            }
+            futures[executor.submit(
+                call_with_retries, archive_to_s3, s3_client, zip_path, bucket_name,
+                archive_key(f"{year}q{quarter}"), transfer_config, metrics, sha256,
+                description=f"Archive of {os.path.basename(zip_path)}"
+            )] = os.path.basename(zip_path)
+            for future in as_completed(futures):
                 try:
-                    # Extract file to temp directory
-                    temp_file = os.path.join(temp_dir, filename)
-                    logger.info(f"Extracting {filename} to {temp_file}")
-                    
-                    with zip_file.open(filename) as source, open(temp_file, 'wb') as target:
-                        target.write(source.read())
-                    
-                    # Upload to S3
-                    s3_key = f"sec_data/{year}q{quarter}/raw/{filename}"
-                    s3_client.upload_file(temp_file, bucket_name, s3_key)
-                    logger.info(f"Successfully uploaded {filename} to S3: {s3_key}")
-                    
-                    # Clean up temp file
-                    os.remove(temp_file)
-                    logger.info(f"Cleaned up temp file: {temp_file}")
-                    
+                    future.result()
                 except Exception as e:
-                    logger.error(f"Error uploading {filename}: {str(e)}")
+                    logger.error(f"Error uploading {futures[future]}: {str(e)}")
                     raise
 
-        # Clean up
-        shutil.rmtree(temp_dir, ignore_errors=True)
-        shutil.rmtree("./data/financial_statement_data_sets", ignore_errors=True)
-        logger.info("Cleaned up all temporary directories")
+        # Clean up only this quarter's files, other quarters may be in flight on this worker
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+        logger.info(f"Cleaned up temporary files for {year}q{quarter}")
         
         return True
 
     except Exception as e:
         logger.error(f"Error in upload_to_s3: {str(e)}")
         raise
+    finally:
+        metrics.publish(context)
 
-def process_and_load_to_snowflake(database, schema, **context):
-    """Process and load data to Snowflake"""
-    def execute_with_context(snow_hook, sql):
-        """Execute SQL with proper database and schema context"""
-        setup_sql = f"""
-        USE DATABASE {database};
-        USE SCHEMA {schema};
-        {sql}
-        """
-        return snow_hook.run(setup_sql)
+def record_fetch_manifest(downloaded_files, year, quarter, **context):
+    """Remember the ingested archive so unchanged reruns are skipped.
 
+    Runs after the quarter was loaded and verified: an unchanged archive skips every
+    downstream task, so recording it any earlier would leave a failed load skipped
+    on every later run.
+    """
+    if isinstance(downloaded_files, str):
+        import ast
+        downloaded_files = ast.literal_eval(downloaded_files)
+    if len(downloaded_files[0]) > 2:
+        save_manifest_entry(get_s3_client(), RAW_BUCKET, year, quarter, downloaded_files[0][2])
+
+# Large TSVs are split into gzip chunks of about this many compressed bytes so
+# COPY can ingest them on parallel warehouse threads
+LOAD_CHUNK_TARGET_BYTES = int(os.getenv('SEC_LOAD_CHUNK_TARGET_BYTES', str(100 * 1024 * 1024)))
+SPLIT_READ_SIZE = 1024 * 1024
+
+def split_tsv(source_path, chunk_dir, stem, target_bytes=LOAD_CHUNK_TARGET_BYTES):
+    """Split a TSV on row boundaries into gzip chunks, repeating the header in each.
+
+    source_path may also be an open binary stream, e.g. a member streamed out of the
+    archived ZIP or a raw S3 body. Returns the list of chunk paths.
+    """
+    os.makedirs(chunk_dir, exist_ok=True)
+    chunks = []
+    raw = gz = None
     try:
-        # Get AWS connection
-        aws_conn = BaseHook.get_connection('aws_default')
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=aws_conn.login,
-            aws_secret_access_key=aws_conn.password,
-            region_name='us-east-1'
-        )
+        with (open(source_path, 'rb') if isinstance(source_path, (str, os.PathLike)) else nullcontext(source_path)) as source:
+            # Read in chunks and split on newlines ourselves: iterating a botocore
+            # StreamingBody yields fixed-size chunks, not lines
+            lines = iter_lines(read_chunks(source, SPLIT_READ_SIZE))
+            header = next(lines, b'') + b'\n'
+            for line in lines:
+                # Compressed size is only known once data is flushed, so the check is approximate
+                if gz is None or raw.tell() >= target_bytes:
+                    if gz is not None:
+                        gz.close()
+                        raw.close()
+                    chunk_path = os.path.join(chunk_dir, f"{stem}_part_{len(chunks):04d}.txt.gz")
+                    raw = open(chunk_path, 'wb')
+                    gz = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6)
+                    gz.write(header)
+                    chunks.append(chunk_path)
+                gz.write(line + b'\n')
+            if gz is None:
+                # Header-only file still needs one chunk
+                chunk_path = os.path.join(chunk_dir, f"{stem}_part_0000.txt.gz")
+                with gzip.open(chunk_path, 'wb') as empty:
+                    empty.write(header)
+                chunks.append(chunk_path)
+    finally:
+        if gz is not None:
+            gz.close()
+            raw.close()
+    return chunks
 
-        # Create temp directory
-        temp_dir = "/tmp"
+# Raw table for each SEC member
+RAW_TABLES = {
+    'RAW_NUM': 'num.txt',
+    'RAW_PRE': 'pre.txt',
+    'RAW_SUB': 'sub.txt',
+    'RAW_TAG': 'tag.txt'
+}
+
+# Before the ledger, the DAG only ever loaded 2023q4 and left quarter unset; those
+# rows are assigned to it so the first per-quarter replace deletes them
+LEGACY_QUARTER = '2023q4'
+
+# Stage over the raw S3 prefix, so COPY can read uploaded members without a PUT
+EXTERNAL_STAGE_NAME = 'sec_raw_s3_stage'
+
+def create_external_stage(cur, bucket_name, aws_conn, storage_integration=None,
+                          stage_name=EXTERNAL_STAGE_NAME, file_format='sec_tsv_format'):
+    """Create the external stage over s3://<bucket>/sec_data/"""
+    if storage_integration:
+        credentials = f"STORAGE_INTEGRATION = {storage_integration}"
+    else:
+        credentials = f"CREDENTIALS = (AWS_KEY_ID = '{aws_conn.login}' AWS_SECRET_KEY = '{aws_conn.password}')"
+    default_format = f"FILE_FORMAT = {file_format}" if file_format else ""
+    cur.execute(f"""
+    CREATE STAGE IF NOT EXISTS {stage_name}
+    URL = 's3://{bucket_name}/sec_data/'
+    {credentials}
+    {default_format}
+    """)
+
+def staging_table(table_name, period):
+    """Transient table a quarter's rows are copied into before the swap, e.g. RAW_NUM_LOAD_2023Q4"""
+    return f"{table_name}_LOAD_{period.upper()}"
+
+def existing_staging_tables(cur, period):
+    """Raw tables whose staging table for this quarter exists in the current schema"""
+    cur.execute(
+        "SELECT table_name FROM information_schema.tables WHERE table_schema = CURRENT_SCHEMA()"
+    )
+    existing = {row[0].upper() for row in cur.fetchall()}
+    return {table_name for table_name in RAW_TABLES if staging_table(table_name, period) in existing}
+
+def load_raw_file(conn, s3_client, table_name, filename, period, temp_dir, bucket_name=RAW_BUCKET,
+                  use_external_stage=False, metrics=None):
+    """Run the split, PUT and COPY for one raw table on a shared Snowflake session.
+
+    Rows are copied into the quarter's transient staging table; the caller swaps them
+    into the real table. With use_external_stage the member is copied straight from
+    the external S3 stage instead of being downloaded and PUT to sec_stage. Safe to
+    call again after a failure. Returns (rows_parsed, rows_loaded) from the COPY result.
+    """
+    metrics = metrics or PipelineMetrics('load_raw_file', quarter=period)
+    stem = filename.replace('.txt', '')
+    load_table = staging_table(table_name, period)
+    try:
+        with conn.cursor() as cur:
+            # Clears rows and COPY load history left by a failed attempt
+            cur.execute(f"TRUNCATE TABLE {load_table}")
+            if use_external_stage:
+                # Copy directly from the raw S3 object; the stage is rooted at sec_data/
+                # and COMPRESSION = AUTO handles the compressed layouts
+                raw_key = raw_member_key(period, filename)
+                logger.info(f"Copying s3://{bucket_name}/{raw_key} via {EXTERNAL_STAGE_NAME}")
+                with metrics.stage('copy', table=table_name) as stage:
+                    cur.execute(f"""
+                    COPY INTO {load_table}
+                    FROM @{EXTERNAL_STAGE_NAME}/{raw_key[len('sec_data/'):]}
+                    FILE_FORMAT = (FORMAT_NAME = sec_tsv_format)
+                    ON_ERROR = 'CONTINUE'
+                    """)
+                    rows_parsed, rows_loaded = copy_result_counts(cur)
+                    stage['rows_loaded'] = rows_loaded
+                    stage['rows_rejected'] = rows_parsed - rows_loaded
+            else:
+                # Stream the member out of the archived ZIP straight into compressed chunks
+                logger.info(f"Streaming {filename} of {period} from S3...")
+                chunk_dir = f"{temp_dir}/{stem}"
+                with metrics.stage('split', table=table_name) as stage, \
+                        open_raw_member(s3_client, bucket_name, period, filename) as (source, size):
+                    stage['bytes'] = size
+                    chunks = split_tsv(source, chunk_dir, stem)
+                logger.info(f"Split {filename} into {len(chunks)} chunks")
+                with metrics.stage('put', table=table_name) as stage:
+                    stage['bytes'] = sum(os.path.getsize(chunk) for chunk in chunks)
+                    cur.execute(f"PUT file://{chunk_dir}/{stem}_part_*.txt.gz @sec_stage/{period}/{stem}/ AUTO_COMPRESS=FALSE OVERWRITE=TRUE PARALLEL=8")
+                
+                # Copy all chunks into table with one statement
+                with metrics.stage('copy', table=table_name) as stage:
+                    cur.execute(f"""
+                    COPY INTO {load_table}
+                    FROM @sec_stage/{period}/{stem}/
+                    PATTERN = '.*{stem}_part_[0-9]+[.]txt[.]gz'
+                    FILE_FORMAT = (FORMAT_NAME = sec_tsv_format)
+                    ON_ERROR = 'CONTINUE'
+                    """)
+                    rows_parsed, rows_loaded = copy_result_counts(cur)
+                    stage['rows_loaded'] = rows_loaded
+                    stage['rows_rejected'] = rows_parsed - rows_loaded
+                
+                # Remove staged chunks
+                cur.execute(f"REMOVE @sec_stage/{period}/{stem}/")
         
-        # Get Snowflake hook
-        snow_hook = SnowflakeHook(snowflake_conn_id='snowflake_default')
+        logger.info(f"Successfully processed {filename}: {rows_loaded} of {rows_parsed} rows loaded")
+        return rows_parsed, rows_loaded
         
-        # First ensure schema exists
-        execute_with_context(snow_hook, f"CREATE SCHEMA IF NOT EXISTS {schema}")
+    except Exception as e:
+        logger.error(f"Error processing {filename}: {str(e)}")
+        raise
+    finally:
+        # Clean up chunks
+        shutil.rmtree(f"{temp_dir}/{stem}", ignore_errors=True)
+
+def raw_file_hashes(s3_client, bucket_name, period):
+    """S3 ETags of a quarter's raw members, used as the change key in the load ledger"""
+    return {
+        table_name: s3_client.head_object(Bucket=bucket_name, Key=raw_member_key(period, filename))['ETag'].strip('"')
+        for table_name, filename in RAW_TABLES.items()
+    }
+
+def process_and_load_to_snowflake(database, schema, year='2023', quarter='4', bucket_name=RAW_BUCKET,
+                                  use_external_stage=False, storage_integration=None, force=False, **context):
+    """Process and load data to Snowflake.
+
+    Each RAW_* row carries its quarter. A quarter is only reloaded when the hash of one
+    of its files differs from the load ledger, and all four tables are replaced for
+    that quarter in one transaction. Every table COPYed into its staging table is
+    checkpointed in the ledger as STAGED, so a retry only loads the tables that failed.
+    """
+    conn = None
+    # Tables whose ledger row must survive a failure (STAGED or LOADED)
+    checkpointed = set()
+    metrics = PipelineMetrics('process_and_load_to_snowflake', quarter=f"{year}q{quarter}")
+    try:
+        if isinstance(use_external_stage, str):
+            use_external_stage = use_external_stage.lower() == 'true'
+        if isinstance(force, str):
+            force = force.lower() == 'true'
         
-        # Create stage
-        execute_with_context(snow_hook, "CREATE STAGE IF NOT EXISTS sec_stage")
+        # Get AWS connection
+        s3_client = get_s3_client()
+
+        # Create temp directory
+        temp_dir = f"/tmp/sec_load/{year}q{quarter}"
+        os.makedirs(temp_dir, exist_ok=True)
+        period = f"{year}q{quarter}"
+        file_hashes = raw_file_hashes(s3_client, bucket_name, period)
         
-        # Process each file
-        files = {
-            'RAW_NUM': 'num.txt',
-            'RAW_PRE': 'pre.txt',
-            'RAW_SUB': 'sub.txt',
-            'RAW_TAG': 'tag.txt'
-        }
+        # One pooled session for the whole task; database/schema context is set once
+        conn = acquire_snowflake_connection()
+        with conn.cursor() as cur:
+            cur.execute(f"USE DATABASE {database}")
+            # First ensure schema exists
+            cur.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+            cur.execute(f"USE SCHEMA {schema}")
+            ensure_ledger_table(cur)
+            # DDL commits implicitly, so it must not run inside the swap transaction
+            ensure_data_version_table(cur)
+            
+            if not force and quarter_is_current(cur, period, file_hashes):
+                logger.info(f"{period} already loaded from identical files, skipping")
+                raise AirflowSkipException(f"{period} unchanged in load ledger")
+            
+            # Shared format for staged chunks (gzip) and raw S3 members (uncompressed)
+            cur.execute("""
+            CREATE FILE FORMAT IF NOT EXISTS sec_tsv_format
+                TYPE = CSV
+                COMPRESSION = AUTO
+                FIELD_DELIMITER = '\t'
+                SKIP_HEADER = 1
+                ERROR_ON_COLUMN_COUNT_MISMATCH = FALSE
+                EMPTY_FIELD_AS_NULL = TRUE
+                REPLACE_INVALID_CHARACTERS = TRUE
+            """)
+            # Create stage
+            if use_external_stage:
+                create_external_stage(cur, bucket_name, get_aws_connection(), storage_integration)
+            else:
+                cur.execute("CREATE STAGE IF NOT EXISTS sec_stage")
+            
+            # Create table if not exists
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS RAW_NUM (
+                adsh VARCHAR,
+                tag VARCHAR,
+                version VARCHAR,
+                coreg VARCHAR,
+                ddate VARCHAR,
+                qtrs VARCHAR,
+                uom VARCHAR,
+                value VARCHAR,
+                footnote VARCHAR
+            )
+            """)
+            
+            # Tables staged by an earlier attempt from the same files are reused
+            counts = {} if force else staged_counts(cur, period, file_hashes)
+            if counts:
+                existing = existing_staging_tables(cur, period)
+                counts = {t: c for t, c in counts.items() if t in existing}
+            checkpointed.update(counts)
+            if counts:
+                logger.info(f"Reusing staged tables from an earlier attempt: {sorted(counts)}")
+            
+            # Quarter partition column, plus a transient staging table to COPY into
+            for table_name in RAW_TABLES:
+                cur.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS quarter VARCHAR")
+                cur.execute(f"UPDATE {table_name} SET quarter = %s WHERE quarter IS NULL", (LEGACY_QUARTER,))
+                if cur.rowcount:
+                    logger.info(f"Assigned {cur.rowcount} unpartitioned rows of {table_name} to {LEGACY_QUARTER}")
+                if table_name not in counts:
+                    cur.execute(f"CREATE OR REPLACE TRANSIENT TABLE {staging_table(table_name, period)} LIKE {table_name}")
         
-        for table_name, filename in files.items():
+        # Run the remaining load pipelines concurrently on the shared session, each
+        # retried on its own and checkpointed as soon as it finishes
+        errors = []
+        with ThreadPoolExecutor(max_workers=len(RAW_TABLES)) as executor:
+            futures = {
+                executor.submit(
+                    call_with_retries, load_raw_file, conn, s3_client, table_name, filename, period, temp_dir,
+                    bucket_name, use_external_stage, metrics, description=f"Load of {table_name}"
+                ): table_name
+                for table_name, filename in RAW_TABLES.items()
+                if table_name not in counts
+            }
+            for future in as_completed(futures):
+                table_name = futures[future]
+                try:
+                    counts[table_name] = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                with conn.cursor() as cur:
+                    record_load(cur, period, table_name, RAW_TABLES[table_name], file_hashes[table_name],
+                                *counts[table_name], 'STAGED')
+                checkpointed.add(table_name)
+        if errors:
+            raise errors[0]
+        
+        # Replace the quarter in all four tables atomically and record it in the ledger
+        with conn.cursor() as cur, metrics.stage('replace_quarter') as stage:
+            stage['rows_loaded'] = sum(rows_loaded for _, rows_loaded in counts.values())
+            cur.execute("BEGIN")
             try:
-                # Create table if not exists
-                if table_name == 'RAW_NUM':
-                    create_table_sql = f"""
-                    CREATE TABLE IF NOT EXISTS {table_name} (
-                        adsh VARCHAR,
-                        tag VARCHAR,
-                        version VARCHAR,
-                        coreg VARCHAR,
-                        ddate VARCHAR,
-                        qtrs VARCHAR,
-                        uom VARCHAR,
-                        value VARCHAR,
-                        footnote VARCHAR
+                for table_name, filename in RAW_TABLES.items():
+                    cur.execute(f"DELETE FROM {table_name} WHERE quarter = %s", (period,))
+                    cur.execute(
+                        f"INSERT INTO {table_name} SELECT * REPLACE (%s AS quarter) FROM {staging_table(table_name, period)}",
+                        (period,)
                     )
-                    """
-                    execute_with_context(snow_hook, create_table_sql)
-                
-                # Download from S3
-                logger.info(f"Downloading sec_data/2023q4/raw/{filename} from S3...")
-                
-                temp_file = f"{temp_dir}/{filename}"
-                s3_client.download_file('sec-edgar-filings', f'sec_data/2023q4/raw/{filename}', temp_file)
-                
-                # Read file to get record count
-                df = pd.read_csv(temp_file, sep='\t', nrows=1)
-                logger.info(f"Read {filename} from S3: {len(df)} records")
-                
-                # Put file to stage
-                put_sql = f"PUT file://{temp_file} @sec_stage AUTO_COMPRESS=TRUE"
-                execute_with_context(snow_hook, put_sql)
-                
-                # Copy into table
-                copy_sql = f"""
-                COPY INTO {table_name}
-                FROM @sec_stage/{filename}
-                FILE_FORMAT = (
-                    TYPE = CSV 
-                    FIELD_DELIMITER = '\t'
-                    SKIP_HEADER = 1
-                    ERROR_ON_COLUMN_COUNT_MISMATCH = FALSE
-                    EMPTY_FIELD_AS_NULL = TRUE
-                    REPLACE_INVALID_CHARACTERS = TRUE
-                )
-                ON_ERROR = 'CONTINUE'
-                """
-                execute_with_context(snow_hook, copy_sql)
-                
-                # Remove staged file
-                execute_with_context(snow_hook, f"REMOVE @sec_stage/{filename}")
-                
-                # Clean up temp file
-                os.remove(temp_file)
-                logger.info(f"Successfully processed {filename}")
-                
-            except Exception as e:
-                logger.error(f"Error processing {filename}: {str(e)}")
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
+                    rows_parsed, rows_loaded = counts[table_name]
+                    record_load(cur, period, table_name, filename, file_hashes[table_name],
+                                rows_parsed, rows_loaded, 'LOADED')
+                publish_data_version(cur, 'sec_data_pipeline', period)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
                 raise
+            checkpointed.update(RAW_TABLES)
+            for table_name in RAW_TABLES:
+                cur.execute(f"DROP TABLE IF EXISTS {staging_table(table_name, period)}")
         
         logger.info("Successfully processed all files")
-        return True
+        return {'quarter': period, 'tables': {t: {'rows_parsed': p, 'rows_loaded': l} for t, (p, l) in counts.items()}}
         
+    except AirflowSkipException:
+        raise
     except Exception as e:
         logger.error(f"Error in process_and_load_to_snowflake: {str(e)}")
-        raise
\ No newline at end of file
+        if conn:
+            try:
+                with conn.cursor() as cur:
+                    for table_name, filename in RAW_TABLES.items():
+                        if table_name not in checkpointed:
+                            record_failure(cur, f"{year}q{quarter}", table_name, filename)
+            except Exception as ledger_error:
+                logger.error(f"Could not record failure in load ledger: {str(ledger_error)}")
+        raise
+    finally:
+        release_snowflake_connection(conn)
+        metrics.publish(context)
@@ -0,0 +1,168 @@
+import os
+import io
+import json
+import zlib
+import gzip
+import logging
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Where extracted members are stored in S3:
+#   flat        sec_data/2023q4/raw/num.txt (uncompressed, the original layout)
+#   partitioned sec_data/raw/year=2023/quarter=4/table=num/num.txt.gz (or .zst)
+# The partitioned layout is Hive-style so Snowflake and local engines can prune by
+# year/quarter/table, and each partition carries a small _manifest.json.
+RAW_LAYOUT = os.getenv('SEC_RAW_LAYOUT', 'flat')
+RAW_COMPRESSION = os.getenv('SEC_RAW_COMPRESSION', 'gzip')
+
+COMPRESSION_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+COMPRESS_READ_SIZE = 1024 * 1024
+PARTITION_MANIFEST = '_manifest.json'
+
+def split_period(period):
+    year, quarter = period.lower().split('q')
+    return year, quarter
+
+def partition_prefix(period, filename):
+    """Hive-style partition of one member, e.g. sec_data/raw/year=2023/quarter=4/table=num"""
+    year, quarter = split_period(period)
+    return f"sec_data/raw/year={year}/quarter={quarter}/table={filename.replace('.txt', '')}"
+
+def raw_member_key(period, filename, layout=None, compression=None):
+    """S3 key of an extracted member in the configured layout"""
+    layout = layout or RAW_LAYOUT
+    if layout == 'flat':
+        return f"sec_data/{period}/raw/{filename}"
+    if layout != 'partitioned':
+        raise ValueError(f"Unknown raw layout: {layout}")
+    compression = compression or RAW_COMPRESSION
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unsupported raw compression: {compression}")
+    return f"{partition_prefix(period, filename)}/{filename}{COMPRESSION_EXTENSIONS[compression]}"
+
+def compression_of(key):
+    """Compression of a raw object, from its extension (None for plain TSVs)"""
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if key.endswith(extension):
+            return compression
+    return None
+
+class GzipCompressingReader(io.RawIOBase):
+    """Readable stream of the gzip-compressed bytes of another stream, for upload_fileobj"""
+
+    def __init__(self, source, level=GZIP_LEVEL):
+        super().__init__()
+        self.source = source
+        self.bytes_in = 0
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        self._pending = b''
+        self._finished = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while len(self._pending) < len(buffer) and not self._finished:
+            chunk = self.source.read(COMPRESS_READ_SIZE)
+            if chunk:
+                self.bytes_in += len(chunk)
+                self._pending += self._compressor.compress(chunk)
+            else:
+                self._pending += self._compressor.flush()
+                self._finished = True
+        count = min(len(buffer), len(self._pending))
+        buffer[:count] = self._pending[:count]
+        self._pending = self._pending[count:]
+        return count
+
+class CountingReader(io.RawIOBase):
+    """Pass-through reader that counts the bytes read from the source"""
+
+    def __init__(self, source):
+        super().__init__()
+        self.source = source
+        self.bytes_in = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self.source.read(len(buffer))
+        self.bytes_in += len(chunk)
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+def compressing_reader(source, compression):
+    """Wrap a binary stream so reading it yields compressed bytes.
+
+    The returned reader exposes bytes_in, the number of uncompressed bytes consumed.
+    """
+    if compression == 'gzip':
+        return GzipCompressingReader(source)
+    if compression == 'zstd':
+        # Optional dependency, only needed when SEC_RAW_COMPRESSION=zstd
+        import zstandard
+        counter = CountingReader(source)
+        return ZstdCompressingReader(zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_reader(counter), counter)
+    return CountingReader(source)
+
+class ZstdCompressingReader(io.RawIOBase):
+    """zstandard's compressing stream reader, exposing bytes_in like the gzip reader"""
+
+    def __init__(self, reader, counter):
+        super().__init__()
+        self._reader = reader
+        self._counter = counter
+
+    @property
+    def bytes_in(self):
+        return self._counter.bytes_in
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self._reader.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+def decompressing_reader(source, key):
+    """Wrap a stream of a raw object so reading it yields the plain TSV bytes"""
+    compression = compression_of(key)
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=source, mode='rb')
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(source)
+    return source
+
+def write_partition_manifest(s3_client, bucket_name, period, filename, key, uncompressed_bytes, archive_sha256=None):
+    """Describe one partition's object(s) in <partition>/_manifest.json"""
+    year, quarter = split_period(period)
+    head = s3_client.head_object(Bucket=bucket_name, Key=key)
+    manifest = {
+        'year': int(year),
+        'quarter': int(quarter),
+        'table': filename.replace('.txt', ''),
+        'files': [{
+            'key': key,
+            'compression': compression_of(key),
+            'bytes': head['ContentLength'],
+            'uncompressed_bytes': uncompressed_bytes,
+            'etag': head['ETag'].strip('"'),
+        }],
+        'archive_sha256': archive_sha256,
+        'written_at': datetime.now(timezone.utc).isoformat(),
+    }
+    manifest_key = f"{partition_prefix(period, filename)}/{PARTITION_MANIFEST}"
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=manifest_key,
+        Body=json.dumps(manifest).encode('utf-8'),
+        ContentType='application/json'
+    )
+    logger.info(f"Wrote partition manifest {manifest_key}: {uncompressed_bytes} -> {head['ContentLength']} bytes")
+    return manifest
@@ -0,0 +1,29 @@
+import os
+import time
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+# In-task retries of a single file/stage, before Airflow retries the whole task
+RETRY_MAX_ATTEMPTS = int(os.getenv('SEC_RETRY_MAX_ATTEMPTS', '3'))
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 60.0
+
+def backoff_delay(attempt, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+    """Full-jitter exponential backoff: uniform in [0, min(max_delay, base * 2**attempt)]"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+def call_with_retries(func, *args, description=None, max_attempts=RETRY_MAX_ATTEMPTS,
+                      retry_on=(Exception,), **kwargs):
+    """Call func, retrying failures with jittered backoff; the last error is re-raised"""
+    description = description or getattr(func, '__name__', 'call')
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return func(*args, **kwargs)
+        except retry_on as e:
+            if attempt == max_attempts:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"{description} failed (attempt {attempt}/{max_attempts}), retrying in {delay:.1f}s: {str(e)}")
+            time.sleep(delay)
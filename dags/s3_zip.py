@@ -0,0 +1,150 @@
+import io
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from zipfile import ZipFile
+from botocore.exceptions import ClientError
+from raw_layout import raw_member_key, decompressing_reader
+
+logger = logging.getLogger(__name__)
+
+# Ranged GETs fetch whole blocks; the central directory and the start of a member
+# usually sit in one or two of them
+RANGE_BLOCK_SIZE = 8 * 1024 * 1024
+RANGE_CACHE_BLOCKS = 4
+
+def archive_key(period):
+    """Where upload_to_s3 keeps the original quarterly ZIP"""
+    return f"sec_data/{period}/archive/{period}.zip"
+
+class S3RangeReader(io.RawIOBase):
+    """Seekable, read-only file over an S3 object backed by ranged GETs.
+
+    Reads are served from an LRU cache of fixed-size blocks, so ZipFile can seek to the
+    central directory and stream a single member without downloading the whole object.
+    Every GET is pinned to the ETag seen when the reader was opened, so a concurrent
+    overwrite fails the read instead of mixing two versions.
+    """
+
+    def __init__(self, s3_client, bucket_name, key, block_size=RANGE_BLOCK_SIZE, cache_blocks=RANGE_CACHE_BLOCKS):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        head = s3_client.head_object(Bucket=bucket_name, Key=key)
+        self.size = head['ContentLength']
+        self.etag = head['ETag']
+        self.bytes_fetched = 0
+        self._position = 0
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def _block(self, index):
+        with self._lock:
+            if index in self._blocks:
+                self._blocks.move_to_end(index)
+                return self._blocks[index]
+
+        start = index * self.block_size
+        end = min(start + self.block_size, self.size) - 1
+        response = self.s3_client.get_object(
+            Bucket=self.bucket_name, Key=self.key, Range=f"bytes={start}-{end}", IfMatch=self.etag
+        )
+        data = response['Body'].read()
+        with self._lock:
+            self.bytes_fetched += len(data)
+            self._blocks[index] = data
+            while len(self._blocks) > self.cache_blocks:
+                self._blocks.popitem(last=False)
+        return data
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        written = 0
+        while written < len(view) and self._position < self.size:
+            index, offset = divmod(self._position, self.block_size)
+            block = self._block(index)
+            count = min(len(block) - offset, len(view) - written)
+            view[written:written + count] = block[offset:offset + count]
+            written += count
+            self._position += count
+        return written
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = max(self.size - self._position, 0)
+        buffer = bytearray(min(size, max(self.size - self._position, 0)))
+        return bytes(buffer[:self.readinto(buffer)])
+
+    def readall(self):
+        return self.read(-1)
+
+@contextmanager
+def open_archive(s3_client, bucket_name, key, **reader_options):
+    """Open a ZIP stored in S3 without downloading it"""
+    reader = S3RangeReader(s3_client, bucket_name, key, **reader_options)
+    try:
+        with ZipFile(reader) as zip_file:
+            yield zip_file
+    finally:
+        logger.info(f"Read {reader.bytes_fetched} of {reader.size} bytes of s3://{bucket_name}/{key}")
+        reader.close()
+
+def archive_exists(s3_client, bucket_name, period):
+    try:
+        s3_client.head_object(Bucket=bucket_name, Key=archive_key(period))
+        return True
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+@contextmanager
+def open_raw_member(s3_client, bucket_name, period, filename):
+    """Stream one member of a quarter, yielding (file object, uncompressed size).
+
+    Reads the member out of the archived ZIP with range reads, which moves the
+    compressed bytes only. Quarters ingested before the archive was kept fall back to
+    the extracted object in the configured raw layout; its size is then the stored
+    (possibly compressed) size.
+    """
+    if archive_exists(s3_client, bucket_name, period):
+        with open_archive(s3_client, bucket_name, archive_key(period)) as zip_file, zip_file.open(filename) as source:
+            yield source, zip_file.getinfo(filename).file_size
+    else:
+        key = raw_member_key(period, filename)
+        response = s3_client.get_object(Bucket=bucket_name, Key=key)
+        try:
+            yield decompressing_reader(response['Body'], key), response['ContentLength']
+        finally:
+            response['Body'].close()
+
+def read_chunks(source, chunk_size):
+    """Iterate over a binary file object in chunks of at most chunk_size bytes"""
+    return iter(lambda: source.read(chunk_size), b'')
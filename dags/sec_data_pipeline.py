@@ -3,10 +3,16 @@ print("Loading DAG file...")
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 from airflow.operators.bash_operator import BashOperator
+from airflow.decorators import task_group
+from airflow.models.param import Param
 from datetime import datetime, timedelta
 from test_connections import test_connections
-from raw import download_sec_data, upload_to_s3, process_and_load_to_snowflake
-from airflow.operators.trigger_dagrun import TriggerDagRunOperator
+from raw import (plan_backfill_quarters, download_sec_data, upload_to_s3, process_and_load_to_snowflake,
+                 record_fetch_manifest)
+from parquet_convert import convert_to_parquet
+from tsv_profiler import validate_raw_files
+from json_data import build_filing_documents, load_json_to_snowflake, verify_data_load
+from sec_datasets import RAW_DATABASE, RAW_SCHEMA, RAW_TABLE_DATASETS
 import logging
 
 import sys
@@ -26,8 +32,12 @@ default_args = {
     'start_date': datetime(2024, 1, 1),
     'email_on_failure': False,
     'email_on_retry': False,
-    'retries': 1,
-    'retry_delay': timedelta(minutes=5),
+    'retries': 2,
+    'retry_delay': timedelta(minutes=1),
+    # Task retries resume from checkpoints (uploaded objects, STAGED tables), so they
+    # are cheap; Airflow spreads them out with exponential backoff
+    'retry_exponential_backoff': True,
+    'max_retry_delay': timedelta(minutes=15),
 }
 
 with DAG(
@@ -35,7 +45,19 @@ with DAG(
     default_args=default_args,
     description='Download SEC financial statement data and upload to S3',
     schedule_interval=None,
-    catchup=False
+    catchup=False,
+    # Quarters are processed in parallel; SEC requests share one rate limiter
+    max_active_tasks=8,
+    params={
+        'start_quarter': Param('2023q4', type='string', pattern=r'^\d{4}q[1-4]$'),
+        'end_quarter': Param('2023q4', type='string', pattern=r'^\d{4}q[1-4]$'),
+        # Explicit quarters (set by sec_release_watcher); overrides the range when not empty
+        'quarters': Param([], type='array', items={'type': 'string', 'pattern': r'^\d{4}q[1-4]$'}),
+        # Re-download and reload even if the fetch manifest / load ledger say nothing changed
+        'force_download': Param(False, type='boolean'),
+        # COPY straight from the raw S3 prefix instead of S3 -> worker -> PUT
+        'use_external_stage': Param(False, type='boolean'),
+    },
 ) as dag:
 
     # Test connections
@@ -45,45 +67,119 @@ with DAG(
         provide_context=True,
     )
 
-    # Download SEC data
-    download_task = PythonOperator(
-        task_id='download_sec_data',
-        python_callable=download_sec_data,
-        op_kwargs={'year': '2023', 'quarter': '4'},
-        provide_context=True,
-    )
-
-    # Upload to S3
-    upload_task = PythonOperator(
-        task_id='upload_to_s3',
-        python_callable=upload_to_s3,
+    # Expand the requested quarter range (a single quarter by default)
+    plan_task = PythonOperator(
+        task_id='plan_backfill_quarters',
+        python_callable=plan_backfill_quarters,
         op_kwargs={
-            'downloaded_files': "{{ task_instance.xcom_pull(task_ids='download_sec_data') }}",
-            'year': '2023', 
-            'quarter': '4'
+            'start_quarter': '{{ params.start_quarter }}',
+            'end_quarter': '{{ params.end_quarter }}',
+            'quarters': '{{ params.quarters }}'
         },
-        provide_context=True,
     )
 
-    # Load to Snowflake
-    load_task = PythonOperator(
-        task_id='process_and_load_to_snowflake',
-        python_callable=process_and_load_to_snowflake,
-        op_kwargs={
-            'database': 'ASSIGNMENT2_TEAM1',
-            'schema': 'RAW_STAGING'
-        },
-        dag=dag
-    )
+    @task_group(group_id='ingest_quarter')
+    def ingest_quarter(year, quarter):
+        # Download SEC data
+        download_task = PythonOperator(
+            task_id='download_sec_data',
+            python_callable=download_sec_data,
+            op_kwargs={
+                'year': year,
+                'quarter': quarter,
+                'force': '{{ params.force_download }}'
+            },
+        )
 
-    # Trigger DBT pipeline
-    trigger_dbt = TriggerDagRunOperator(
-        task_id='trigger_dbt_pipeline',
-        trigger_dag_id='dbt_transformation_pipeline',
-    )
+        # Upload to S3
+        upload_task = PythonOperator(
+            task_id='upload_to_s3',
+            python_callable=upload_to_s3,
+            op_kwargs={
+                'downloaded_files': download_task.output,
+                'year': year,
+                'quarter': quarter
+            },
+        )
+
+        # Profile and validate the raw TSVs before paying for a COPY
+        validate_task = PythonOperator(
+            task_id='validate_raw_files',
+            python_callable=validate_raw_files,
+            op_kwargs={'year': year, 'quarter': quarter},
+        )
+
+        # One nested JSON document per filing, written as NDJSON shards
+        json_task = PythonOperator(
+            task_id='build_filing_documents',
+            python_callable=build_filing_documents,
+            op_kwargs={'year': year, 'quarter': quarter},
+        )
+
+        # Bulk load the shards into the JSON schema
+        json_load_task = PythonOperator(
+            task_id='load_json_to_snowflake',
+            python_callable=load_json_to_snowflake,
+            op_kwargs={
+                'year': year,
+                'quarter': quarter,
+                'force': '{{ params.force_download }}'
+            },
+        )
+
+        # Row count and content hash checks for every table of the quarter
+        verify_task = PythonOperator(
+            task_id='verify_data_load',
+            python_callable=verify_data_load,
+            op_kwargs={'year': year, 'quarter': quarter},
+            # A skipped load means the quarter was verified when it was first loaded
+            trigger_rule='none_failed_min_one_success',
+        )
+
+        # Only a loaded and verified quarter is skipped by later runs
+        manifest_task = PythonOperator(
+            task_id='record_fetch_manifest',
+            python_callable=record_fetch_manifest,
+            op_kwargs={
+                'downloaded_files': download_task.output,
+                'year': year,
+                'quarter': quarter
+            },
+        )
+
+        # Load to Snowflake
+        load_task = PythonOperator(
+            task_id='process_and_load_to_snowflake',
+            python_callable=process_and_load_to_snowflake,
+            op_kwargs={
+                'database': RAW_DATABASE,
+                'schema': RAW_SCHEMA,
+                'year': year,
+                'quarter': quarter,
+                'use_external_stage': '{{ params.use_external_stage }}',
+                'force': '{{ params.force_download }}'
+            },
+            # dbt_transformation_pipeline is scheduled on these; skipped loads emit nothing
+            outlets=RAW_TABLE_DATASETS,
+        )
+
+        # Typed, compressed Parquet copy of the raw TSVs
+        parquet_task = PythonOperator(
+            task_id='convert_to_parquet',
+            python_callable=convert_to_parquet,
+            op_kwargs={'year': year, 'quarter': quarter},
+        )
+
+        download_task >> upload_task >> [validate_task, parquet_task]
+        validate_task >> [load_task, json_task]
+        json_task >> json_load_task
+        [load_task, json_load_task] >> verify_task >> manifest_task
+
+    # One download >> upload >> load chain per quarter, run as parallel mapped tasks
+    ingest_tasks = ingest_quarter.expand_kwargs(plan_task.output)
 
-    # Set task dependencies
-    test_conn_task >> download_task >> upload_task >> load_task >> trigger_dbt
+    # Set task dependencies; dbt runs from the RAW_* dataset events of the load tasks
+    test_conn_task >> plan_task >> ingest_tasks
 
 print("Imports successful...")
 
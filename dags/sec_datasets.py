@@ -0,0 +1,12 @@
+from airflow.datasets import Dataset
+
+# Datasets updated by the ingest DAG. A load task only succeeds (and emits an event)
+# when it actually replaced a quarter; unchanged quarters are skipped.
+RAW_DATABASE = 'ASSIGNMENT2_TEAM1'
+RAW_SCHEMA = 'RAW_STAGING'
+RAW_TABLE_NAMES = ['RAW_NUM', 'RAW_PRE', 'RAW_SUB', 'RAW_TAG']
+
+def snowflake_dataset(database, schema, table_name):
+    return Dataset(f"snowflake://{database}/{schema}/{table_name}")
+
+RAW_TABLE_DATASETS = [snowflake_dataset(RAW_DATABASE, RAW_SCHEMA, table_name) for table_name in RAW_TABLE_NAMES]
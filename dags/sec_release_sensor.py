@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from datetime import date, timedelta
+from airflow.sensors.base import BaseSensorOperator
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+from rate_limiter import sec_rate_limiter
+from connections import get_s3_client
+from fetch_manifest import load_manifest_entry
+
+logger = logging.getLogger(__name__)
+
+SEC_DATASET_URL = "https://www.sec.gov/files/dera/data/financial-statement-data-sets/{period}.zip"
+SEC_HEADERS = {
+    'User-Agent': 'Sample Company Name AdminContact@company.com',
+    'Accept-Encoding': 'identity',
+    'Host': 'www.sec.gov'
+}
+
+# SEC publishes a quarter shortly after it ends and sometimes reissues recent ones,
+# so the most recent few completed quarters are watched
+RELEASE_LOOKBACK_QUARTERS = 2
+RELEASE_POLL_INTERVAL = timedelta(hours=1)
+
+def recent_quarters(today=None, count=RELEASE_LOOKBACK_QUARTERS):
+    """The last count completed quarters as '2024q1' style periods, newest first"""
+    today = today or date.today()
+    year, quarter = today.year, (today.month - 1) // 3 + 1
+    periods = []
+    for _ in range(count):
+        year, quarter = (year - 1, 4) if quarter == 1 else (year, quarter - 1)
+        periods.append(f"{year}q{quarter}")
+    return periods
+
+def release_changed(headers, known):
+    """True if a HEAD response describes an archive other than the ingested one"""
+    if not known:
+        return True
+    etag, last_modified = headers.get('ETag'), headers.get('Last-Modified')
+    if etag and known.get('etag'):
+        return etag != known['etag']
+    return bool(last_modified) and last_modified != known.get('last_modified')
+
+class SecReleaseTrigger(BaseTrigger):
+    """Polls SEC with HEAD requests from the triggerer until a watched quarter is new or changed.
+
+    known maps each watched period to the ETag / Last-Modified of its last ingest
+    (an empty dict for quarters never ingested).
+    """
+
+    def __init__(self, known, poll_interval=RELEASE_POLL_INTERVAL.total_seconds()):
+        super().__init__()
+        self.known = known
+        self.poll_interval = poll_interval
+
+    def serialize(self):
+        return (
+            'sec_release_sensor.SecReleaseTrigger',
+            {'known': self.known, 'poll_interval': self.poll_interval},
+        )
+
+    async def check_releases(self, session):
+        changed = []
+        for period, known in self.known.items():
+            # Shares the SEC request budget with the download workers
+            await sec_rate_limiter.acquire_async()
+            url = SEC_DATASET_URL.format(period=period)
+            async with session.head(url, headers=SEC_HEADERS, allow_redirects=True) as response:
+                if response.status == 404:
+                    logger.info(f"{period} not published yet")
+                    continue
+                if response.status != 200:
+                    logger.warning(f"HEAD {url} returned {response.status}")
+                    continue
+                if release_changed(response.headers, known):
+                    logger.info(f"{period} is new or changed (ETag {response.headers.get('ETag')})")
+                    changed.append(period)
+        return changed
+
+    async def run(self):
+        # aiohttp ships with the Airflow image (HTTP provider) and keeps the triggerer non-blocking
+        import aiohttp
+
+        timeout = aiohttp.ClientTimeout(total=60)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while True:
+                try:
+                    changed = await self.check_releases(session)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.warning(f"SEC release check failed, retrying next poll: {str(e)}")
+                    changed = []
+                if changed:
+                    yield TriggerEvent({'status': 'changed', 'quarters': sorted(changed)})
+                    return
+                await asyncio.sleep(self.poll_interval)
+
+class SecReleaseSensor(BaseSensorOperator):
+    """Deferrable sensor for new or reissued SEC financial statement data sets.
+
+    The worker only reads the fetch manifest and defers; the HEAD polling happens on
+    the triggerer, so no worker slot is held while waiting. Returns the changed
+    quarters as periods like ['2024q1'] for the ingest DAG's quarters param.
+    """
+
+    def __init__(self, bucket_name="sec-finance-data-team1", lookback=RELEASE_LOOKBACK_QUARTERS,
+                 poll_interval=RELEASE_POLL_INTERVAL, **kwargs):
+        super().__init__(**kwargs)
+        self.bucket_name = bucket_name
+        self.lookback = lookback
+        self.poll_interval = poll_interval
+
+    def execute(self, context):
+        s3_client = get_s3_client()
+        known = {}
+        for period in recent_quarters(count=self.lookback):
+            year, quarter = period.split('q')
+            entry = load_manifest_entry(s3_client, self.bucket_name, year, quarter) or {}
+            known[period] = {key: entry.get(key) for key in ('etag', 'last_modified') if entry.get(key)}
+        logger.info(f"Watching SEC releases for {sorted(known)}")
+        self.defer(
+            trigger=SecReleaseTrigger(known, self.poll_interval.total_seconds()),
+            method_name='execute_complete',
+            timeout=timedelta(seconds=self.timeout),
+        )
+
+    def execute_complete(self, context, event=None):
+        logger.info(f"New SEC releases: {event['quarters']}")
+        return event['quarters']
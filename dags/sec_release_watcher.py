@@ -0,0 +1,41 @@
+from airflow import DAG
+from airflow.operators.trigger_dagrun import TriggerDagRunOperator
+from datetime import datetime, timedelta
+from sec_release_sensor import SecReleaseSensor
+
+default_args = {
+    'owner': 'airflow',
+    'depends_on_past': False,
+    'start_date': datetime(2024, 1, 1),
+    'email_on_failure': False,
+    'email_on_retry': False,
+    'retries': 1,
+    'retry_delay': timedelta(minutes=5),
+}
+
+with DAG(
+    'sec_release_watcher',
+    default_args=default_args,
+    description='Start sec_data_pipeline when SEC publishes or reissues a quarterly data set',
+    schedule_interval='@daily',
+    catchup=False,
+    max_active_runs=1,
+    # Hand the sensor's list of quarters to the ingest DAG as a real list
+    render_template_as_native_obj=True,
+) as dag:
+
+    # Deferred to the triggerer while waiting; skipped if nothing changes today
+    wait_for_release = SecReleaseSensor(
+        task_id='wait_for_sec_release',
+        timeout=timedelta(hours=23).total_seconds(),
+        soft_fail=True,
+    )
+
+    # Ingest only the quarters that changed
+    trigger_ingest = TriggerDagRunOperator(
+        task_id='trigger_sec_data_pipeline',
+        trigger_dag_id='sec_data_pipeline',
+        conf={'quarters': "{{ ti.xcom_pull(task_ids='wait_for_sec_release') }}"},
+    )
+
+    wait_for_release >> trigger_ingest
@@ -0,0 +1,197 @@
+import json
+import math
+import hashlib
+import logging
+from connections import get_s3_client
+from pipeline_metrics import PipelineMetrics
+from s3_zip import open_raw_member, read_chunks
+
+logger = logging.getLogger(__name__)
+
+# Columns that must parse as numbers, and key columns whose cardinality is estimated
+NUMERIC_COLUMNS = {
+    'num.txt': ['ddate', 'qtrs', 'value'],
+    'pre.txt': ['report', 'line', 'inpth', 'negating'],
+    'sub.txt': ['cik', 'sic', 'period', 'fy', 'filed', 'prevrpt', 'detail', 'nciks'],
+    'tag.txt': ['custom', 'abstract'],
+}
+KEY_COLUMNS = {
+    'num.txt': ['adsh', 'tag', 'version'],
+    'pre.txt': ['adsh', 'tag'],
+    'sub.txt': ['adsh', 'cik'],
+    'tag.txt': ['tag', 'version'],
+}
+
+# A file fails validation when more than this share of rows is malformed
+MAX_COLUMN_MISMATCH_RATE = 0.001
+MAX_NUMERIC_FAILURE_RATE = 0.001
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Row fingerprint used on both sides of the load verification: the first 15 hex digits
+# of the MD5 of the tab-joined row (NULL as ''), summed so row order does not matter.
+# HASH_AGG is not reproducible outside Snowflake, MD5 is.
+FINGERPRINT_HEX_DIGITS = 15
+
+def row_fingerprint(fields, width):
+    """Fingerprint of a row as the COPY loads it: width columns, extra fields dropped"""
+    if len(fields) != width:
+        fields = fields[:width] + [b''] * (width - len(fields))
+    row = b'\t'.join(fields)
+    if not row.isascii():
+        # Invalid UTF-8 is replaced like REPLACE_INVALID_CHARACTERS does in the load
+        row = row.decode('utf-8', 'replace').encode('utf-8')
+    return int(hashlib.md5(row).hexdigest()[:FINGERPRINT_HEX_DIGITS], 16)
+
+class HyperLogLog:
+    """Fixed-memory distinct count estimator (2**precision one-byte registers)"""
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+        self.alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    def add(self, value):
+        x = int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'big')
+        index = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self):
+        estimate = self.alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+def iter_lines(chunks):
+    """Split a stream of byte chunks on \\n without holding more than one chunk"""
+    pending = b''
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip(b'\r')
+    if pending:
+        yield pending.rstrip(b'\r')
+
+def profile_tsv(lines, filename):
+    """Profile one SEC TSV in a single pass over its lines.
+
+    content_hash is the sum of the row fingerprints, which verify_data_load compares
+    with the loaded table.
+    """
+    lines = iter(lines)
+    header = next(lines, b'').decode('utf-8').split('\t')
+    width = len(header)
+    index = {name: i for i, name in enumerate(header)}
+    numeric = [(name, index[name]) for name in NUMERIC_COLUMNS.get(filename, []) if name in index]
+    keys = [(name, index[name], HyperLogLog()) for name in KEY_COLUMNS.get(filename, []) if name in index]
+
+    rows = 0
+    mismatches = 0
+    content_hash = 0
+    nulls = [0] * width
+    numeric_failures = {name: 0 for name, _ in numeric}
+
+    for line in lines:
+        if not line:
+            continue
+        rows += 1
+        fields = line.split(b'\t')
+        content_hash += row_fingerprint(fields, width)
+        if len(fields) != width:
+            mismatches += 1
+            continue
+        for i, field in enumerate(fields):
+            if not field:
+                nulls[i] += 1
+        for name, i in numeric:
+            field = fields[i]
+            if field:
+                try:
+                    float(field)
+                except ValueError:
+                    numeric_failures[name] += 1
+        for _, i, hll in keys:
+            hll.add(fields[i])
+
+    return {
+        'file': filename,
+        'rows': rows,
+        'columns': header,
+        'column_count_mismatches': mismatches,
+        'null_rate': {name: round(nulls[i] / rows, 6) if rows else 0.0 for i, name in enumerate(header)},
+        'numeric_failures': numeric_failures,
+        'distinct_estimates': {name: hll.estimate() for name, _, hll in keys},
+        'content_hash': content_hash,
+    }
+
+def profile_problems(profile, max_mismatch_rate=MAX_COLUMN_MISMATCH_RATE, max_numeric_failure_rate=MAX_NUMERIC_FAILURE_RATE):
+    """Human readable reasons a profile should fail validation"""
+    problems = []
+    rows = profile['rows']
+    if rows == 0:
+        problems.append(f"{profile['file']} has no data rows")
+        return problems
+    if profile['column_count_mismatches'] / rows > max_mismatch_rate:
+        problems.append(f"{profile['file']}: {profile['column_count_mismatches']} of {rows} rows have the wrong column count")
+    for name, failures in profile['numeric_failures'].items():
+        if failures / rows > max_numeric_failure_rate:
+            problems.append(f"{profile['file']}: {failures} of {rows} values in {name} are not numeric")
+    return problems
+
+def profile_key(period):
+    return f"sec_data/{period}/profile/profile.json"
+
+def load_profiles(s3_client, bucket_name, period):
+    """Profiles published by validate_raw_files for a quarter, keyed by member file name"""
+    body = s3_client.get_object(Bucket=bucket_name, Key=profile_key(period))['Body']
+    return json.loads(body.read())
+
+def validate_raw_files(year, quarter, bucket_name="sec-finance-data-team1", **context):
+    """Stream each member of a quarter from the archived ZIP once, publish its profile and fail on bad files"""
+    metrics = PipelineMetrics('validate_raw_files', quarter=f"{year}q{quarter}")
+    try:
+        s3_client = get_s3_client()
+
+        period = f"{year}q{quarter}"
+        profiles = {}
+        problems = []
+        for filename in NUMERIC_COLUMNS:
+            logger.info(f"Profiling {filename} of {period}")
+            with metrics.stage('validate', member=filename) as stage, \
+                    open_raw_member(s3_client, bucket_name, period, filename) as (source, size):
+                profile = profile_tsv(iter_lines(read_chunks(source, READ_CHUNK_SIZE)), filename)
+                stage['bytes'] = size
+                stage['rows_loaded'] = profile['rows']
+                stage['rows_rejected'] = profile['column_count_mismatches']
+            profiles[filename] = profile
+            problems.extend(profile_problems(profile))
+            logger.info(
+                f"{filename}: {profile['rows']} rows, {profile['column_count_mismatches']} column count mismatches, "
+                f"distinct {profile['distinct_estimates']}"
+            )
+
+        s3_client.put_object(
+            Bucket=bucket_name,
+            Key=profile_key(period),
+            Body=json.dumps(profiles).encode('utf-8'),
+            ContentType='application/json'
+        )
+
+        if problems:
+            raise ValueError(f"Validation failed for {period}: " + "; ".join(problems))
+
+        return profiles
+
+    except Exception as e:
+        logger.error(f"Error in validate_raw_files: {str(e)}")
+        raise
+    finally:
+        metrics.publish(context)